@@ -0,0 +1,122 @@
+"""Infrastructure Units Reports, several years.
+
+Create the merged files A-H for several years concurrently, one process
+per year, using the configuration for each year; see 'year_config.py'.
+The cache of parsed input files is shared by all years, so an input file
+which is identical for several years is parsed only once. A table of
+the time taken by each stage for each year is printed.
+With '--warehouse', the records of all merged files for each year are
+also stored in the warehouse database; see 'warehouse.py'.
+
+    $ python batch.py [--workers N] [--engine xlsx] [--no-cache] [--warehouse] [year ...]
+
+All years having a configuration are done if no year is given.
+"""
+
+import argparse
+import concurrent.futures
+
+import columnar
+import facility_data
+import pipeline
+import warehouse
+import year_config
+
+
+def run_year(year, targets=pipeline.TARGETS, engine=facility_data.ENGINE,
+             warehouse_filepath=None, use_cache=True, data_only=False,
+             columnar_format=None):
+    """Create the merged files for the year, and store its records in the
+    warehouse if its file path is given. See 'pipeline.run' for the
+    other options. Return the list of tuples (stage, time) for the year.
+    """
+    config = year_config.load(year)
+    timer = pipeline.run(list(targets), engine=engine, config=config,
+                         warehouse_filepath=warehouse_filepath,
+                         use_cache=use_cache,
+                         data_only=data_only,
+                         columnar_format=columnar_format)
+    return timer.timings
+
+def run_years(years, targets=pipeline.TARGETS, workers=None,
+              engine=facility_data.ENGINE, warehouse_filepath=None,
+              use_cache=True, data_only=False, columnar_format=None):
+    """Create the merged files for the years concurrently, in a pool
+    of the given number of processes; by default one per CPU.
+    The warehouse database serializes the storing of the years.
+    Return a dictionary with the year as key and the timings as value.
+    """
+    result = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = dict([(pool.submit(run_year, year, list(targets), engine,
+                                     warehouse_filepath, use_cache,
+                                     data_only, columnar_format),
+                         year)
+                        for year in years])
+        for future in concurrent.futures.as_completed(futures):
+            result[futures[future]] = future.result()
+    return dict([(year, result[year]) for year in years])
+
+def print_table(timings):
+    """Print a table of the time for each stage (rows) and year (columns),
+    given the dictionary with the year as key and the timings as value.
+    """
+    stages = []
+    for year_timings in timings.values():
+        for stage, elapsed in year_timings:
+            if stage not in stages:
+                stages.append(stage)
+    lookup = dict([(year, dict(year_timings))
+                   for year, year_timings in timings.items()])
+    print()
+    print(f"{'stage':20s}" + "".join([f"{year:>10d}" for year in timings]))
+    for stage in stages:
+        cells = []
+        for year in timings:
+            elapsed = lookup[year].get(stage)
+            cells.append("         -" if elapsed is None else f"{elapsed:10.3f}")
+        print(f"{stage:20s}" + "".join(cells))
+    print(f"{'total':20s}" + "".join([f"{sum(lookup[year].values()):10.3f}"
+                                      for year in timings]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("years", nargs="*", type=int,
+                        help="the years to create the merged files for, any of"
+                        f" {' '.join([str(y) for y in year_config.get_years()])};"
+                        " default all")
+    parser.add_argument("--workers", type=int,
+                        help="number of processes; default one per CPU")
+    parser.add_argument("--engine", choices=["openpyxl", "xlsx"],
+                        default=facility_data.ENGINE,
+                        help="engine for reading XLSX files")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="do not use the cache of parsed input files")
+    parser.add_argument("--data-only", action="store_true",
+                        help="write the merged files without any styling")
+    # Only one columnar format can be written.
+    formats = parser.add_mutually_exclusive_group()
+    formats.add_argument("--parquet", action="store_true",
+                         help="also write each merged file as a Parquet file")
+    formats.add_argument("--arrow", action="store_true",
+                         help="also write each merged file as an Arrow IPC"
+                         " file")
+    parser.add_argument("--warehouse", action="store_true",
+                        help="store the records in the warehouse database")
+    args = parser.parse_args()
+    columnar_format = columnar.get_format(args)
+    if columnar_format and columnar.pyarrow is None:
+        parser.error("the 'pyarrow' package is needed for columnar files")
+    for year in args.years:
+        if year not in year_config.get_years():
+            parser.error(f"no configuration for year {year}")
+    timings = run_years(args.years or year_config.get_years(),
+                        workers=args.workers,
+                        engine=args.engine,
+                        warehouse_filepath=warehouse.WAREHOUSE_FILEPATH
+                        if args.warehouse else None,
+                        use_cache=not args.no_cache,
+                        data_only=args.data_only,
+                        columnar_format=columnar_format)
+    print_table(timings)
@@ -0,0 +1,819 @@
+"""Benchmarks for reading the unit report data.
+
+Synthetic input files are created in a temporary directory, so no real
+report data is needed. Each measurement is made in a fresh Python process,
+so that the peak RSS (resident set size) reflects only that reader.
+
+    $ python benchmark.py [name ...]
+
+where 'name' is any of the benchmarks in BENCHMARKS. All are run if
+no name is given. The cache of parsed input files is not used.
+"""
+
+import csv
+import datetime
+import functools
+import io
+import os.path
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import openpyxl
+import xlsxwriter
+
+import dates
+import facility_data
+import fellows
+import merge_A
+import merge_B
+import merge_C
+import merge_D
+import merge_E
+import make_fig5
+import year_config
+
+
+def make_aggregate_file(filepath, units=800, text_length=3000):
+    """Create a synthetic aggregate file similar to the one from the
+    Reporting Portal: one row per unit, with long free-text fields.
+    """
+    header = ["identifier", "title", "facility"] + merge_A.FIELD_IDENTIFIERS
+    rnd = random.Random(units)
+    words = ["lorem", "ipsum", "dolor", "sit", "amet", "sequencing",
+             "proteomics", "imaging", "users", "platform", "national"]
+    names = sorted(facility_data.PLATFORM_LOOKUP)
+    wb = xlsxwriter.Workbook(filepath)
+    ws = wb.add_worksheet()
+    ws.write_row(0, 0, header)
+    for row in range(1, units+1):
+        values = [f"id{row:05d}", f"Report {row}", names[(row-1) % len(names)]]
+        for fid in merge_A.FIELD_IDENTIFIERS:
+            if fid in ("user_fee_models", "impact_covid19", "user_feedback",
+                       "innovation_utilization", "technology_development",
+                       "scientific_achievements"):
+                values.append(random_text(rnd, words, text_length))
+            else:
+                values.append(row * 1.5)
+        ws.write_row(row, 0, values)
+    wb.close()
+
+# The fields of the table field aggregate files.
+TABLE_FIELDS = {
+    "facility_director": ["First name", "Last name", "Email address",
+                          "Affiliation (University)", "Percent salary"],
+    "facility_head": ["First name", "Last name", "Email address",
+                      "Affiliation (University)", "Percent salary"],
+    "additional_funding": ["Category of financier", "Name/type of financier",
+                           "Amount (kSEK)"],
+    "immaterial_property_rights": ["Patent title",
+                                   "Patent application number",
+                                   "Filed or granted during 2018?",
+                                   "Registered designs",
+                                   "Registered trademarks"],
+}
+
+def make_table_records(table, units, count):
+    """Return synthetic records for the given table field, 'count' records
+    for each of the given units, as from an aggregate file.
+    """
+    result = []
+    for unit in units:
+        for number in range(count):
+            record = {"facility": unit}
+            for field in TABLE_FIELDS[table]:
+                if field == "Percent salary":
+                    value = 10 * number
+                elif field == "Amount (kSEK)":
+                    value = 1000 + number
+                else:
+                    value = f"{field} {number}"
+                record[f"{table}: {field}"] = value
+            result.append(record)
+    return result
+
+def make_table_file(filepath, records):
+    "Create a file like an aggregate file, containing the given records."
+    wb = xlsxwriter.Workbook(filepath)
+    ws = wb.add_worksheet()
+    header = list(records[0])
+    ws.write_row(0, 0, header)
+    for row, record in enumerate(records, 1):
+        ws.write_row(row, 0, [record[key] for key in header])
+    wb.close()
+
+def make_input_files(basedirpath, users=200, rows=10):
+    """Create synthetic aggregate files and volume data files, for all
+    units, in the directory structure used for the real data.
+    """
+    dirpath = os.path.join(basedirpath, "aggregate_files")
+    voldirpath = os.path.join(basedirpath, "volume_data_files")
+    for path in (dirpath, voldirpath,
+                 os.path.join(basedirpath, "merged_files"),
+                 os.path.join(basedirpath, "figures")):
+        os.makedirs(path, exist_ok=True)
+    units = sorted(facility_data.PLATFORM_LOOKUP)
+    basefilename = facility_data.BASEFILENAME
+    make_aggregate_file(os.path.join(dirpath, f"{basefilename}.xlsx"),
+                        units=len(units), text_length=200)
+    for table, count in [("facility_director", 1), ("facility_head", 2),
+                         ("additional_funding", 3),
+                         ("immaterial_property_rights", 1)]:
+        make_table_file(os.path.join(dirpath, f"{basefilename}_{table}.xlsx"),
+                        make_table_records(table, units, count))
+    make_volume_files(voldirpath, count=len(units), users=users, rows=rows)
+
+# The sheets and their header rows in the volume data files.
+KEY = "1.  Name of reporting unit* (choose from drop-down menu)"
+VOLUME_SHEETS = {
+    "A. Users": [KEY,
+                 "2. Your e-mail address*",
+                 "3a. First name of the responsible PI*",
+                 "3b. Surname of the responsible PI*",
+                 "4. E-mail address of responsible PI*",
+                 "5a. Affiliation of PI: Specific university or"
+                 " category (choose from drop-down menu)*",
+                 "5b. For non-specific universities and categories"
+                 " in 5a, name the organization (free text)"],
+    "B. Courses": [KEY,
+                   "2. Your e-mail address*",
+                   "3. Full name of the course*",
+                   "4a. Did the reporting unit organize or co-organize the course?*",
+                   "4b. If co-organized, with whom?",
+                   "5. Start date* (yyyy-mm-dd)",
+                   "6. End date* (yyyy-mm-dd)",
+                   "7. Location (city) of the course*",
+                   "8. Comment"],
+    "C. Conf, symp, semin": [KEY,
+                             "2. Your e-mail address*",
+                             "3. Name of activity*",
+                             "4a. Did the reporting unit organize or co-organize this activity?*",
+                             "4b. If co-organized, with whom?",
+                             "5. Start date* (yyyy-mm-dd)",
+                             "6. End date* (yyyy-mm-dd)",
+                             "7. Location (city) of activity *",
+                             "8. Comment"],
+    "D. External Collab ": [KEY,
+                            "2. Your e-mail address*",
+                            "3. Name of external organization*",
+                            "4. Type of organization* (choose from drop-down menu)",
+                            "5. Reference person",
+                            "6. Purpose of collabaration/alliance*"],
+}
+
+AFFILIATIONS = ["Karolinska Institutet",
+                "KTH Royal Institute of Technology",
+                "Uppsala University",
+                "Industry",
+                "International University"]
+
+def make_volume_file(filepath, unit, users=1000, rows=50, formulas=False):
+    """Create a synthetic volume data file for the given unit, with
+    the given number of users, and of rows in the other sheets.
+    Each sheet has a few lines of instructions before the header row.
+    If 'formulas' is True, every tenth PI email address in the users
+    sheet is a formula computing it from the PI name.
+    """
+    rnd = random.Random(filepath)
+    wb = xlsxwriter.Workbook(filepath)
+    date_format = wb.add_format({"num_format": "yyyy-mm-dd"})
+    for sheetname, header in VOLUME_SHEETS.items():
+        ws = wb.add_worksheet(sheetname)
+        ws.write(0, 0, f"{sheetname}: Instructions")
+        ws.write(1, 1, "Fill in one row per item.")
+        ws.write_row(3, 0, header)
+        for row in range(4, 4 + (users if sheetname == "A. Users" else rows)):
+            first = rnd.choice(["Anna", "Per", "Lena", "Erik", "Maria"])
+            last = rnd.choice(["Andersson", "Berg", "Lind", "Nilsson"])
+            ws.write(row, 0, unit)
+            ws.write(row, 1, f"staff{rnd.randrange(5)}@example.se")
+            for col, title in enumerate(header[2:], 2):
+                if "date" in title:
+                    value = datetime.datetime(2022, rnd.randrange(1, 13),
+                                              rnd.randrange(1, 29))
+                    ws.write_datetime(row, col, value, date_format)
+                elif "First name" in title:
+                    ws.write(row, col, first)
+                elif "Surname" in title:
+                    ws.write(row, col, last)
+                elif "E-mail" in title:
+                    if formulas and row % 10 == 0:
+                        ws.write_formula(row, col,
+                                         f'=C{row+1}&"."&D{row+1}&"@example.se"')
+                    else:
+                        ws.write(row, col, f"{first}.{last}{row}@example.se")
+                elif "Affiliation" in title:
+                    ws.write(row, col, rnd.choice(AFFILIATIONS))
+                else:
+                    ws.write(row, col, f"{title.split()[0]} {row}")
+    wb.close()
+
+def make_volume_files(dirpath, count=40, users=1000, rows=50):
+    "Create the given number of synthetic volume data files in the directory."
+    units = sorted(facility_data.PLATFORM_LOOKUP)
+    for number in range(count):
+        unit = units[number % len(units)]
+        make_volume_file(os.path.join(dirpath, f"volume_{number:03d}.xlsx"),
+                         unit, users=users, rows=rows)
+
+def random_text(rnd, words, length):
+    "Return a random text of approximately the given length."
+    result = []
+    while length > 0:
+        result.append(rnd.choice(words) + str(rnd.randrange(1000)))
+        length -= len(result[-1]) + 1
+    return " ".join(result)
+
+def read_file_edit_mode(filepath):
+    "The previous implementation: load all cells in edit mode."
+    wb = openpyxl.load_workbook(filename=filepath)
+    rows = list(wb.active)
+    wb.close()
+    header = [c.value.strip() for c in rows[0]]
+    return [dict(list(zip(header, [c.value for c in row])))
+            for row in rows[1:]]
+
+def read_volume_sheet_chunked(ws, skip_rows_until):
+    """The previous implementation of the row reading for a volume data
+    sheet: get chunks of 100 rows until the first cell has no value.
+    Only the reading of the rows; returns the list of rows.
+    """
+    rows = []
+    while True:
+        for row in ws.iter_rows(min_row=len(rows)+1, max_row=len(rows)+100):
+            rows.append([cell.value for cell in row])
+        if not rows[-1] or rows[-1][0] is None: break
+    while rows[-1][0] is None:
+        rows.pop()
+    return rows
+
+# Readers that can be measured in a child process.
+READERS = {
+    "edit_mode": read_file_edit_mode,
+    # The cache is not used, so that the file is really read each time.
+    "read_only": functools.partial(facility_data.read_file, use_cache=False),
+    "streaming": facility_data.iter_file,
+}
+
+def run_child(reader, filepath):
+    "Run the reader in this process, and print elapsed time and peak RSS."
+    start = time.perf_counter()
+    count = 0
+    for record in READERS[reader](filepath):
+        count += 1
+    elapsed = time.perf_counter() - start
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(count, elapsed, maxrss)
+
+def measure(reader, filepath):
+    "Run the reader in a fresh process. Return count, seconds and peak RSS."
+    output = subprocess.run([sys.executable, __file__, "--child",
+                             reader, filepath],
+                            check=True, capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    count, elapsed, maxrss = output.stdout.split()
+    return int(count), float(elapsed), int(maxrss)
+
+def bench_read_file():
+    "Compare the edit-mode and read-only readers of an aggregate file."
+    with tempfile.TemporaryDirectory() as dirpath:
+        filepath = os.path.join(dirpath, "aggregate.xlsx")
+        make_aggregate_file(filepath)
+        print(f"aggregate file {os.path.getsize(filepath)//1024} kB")
+        for reader in READERS:
+            count, elapsed, maxrss = measure(reader, filepath)
+            print(f"{reader:12s} {count:6d} rows {elapsed:8.3f} s"
+                  f" {maxrss//1024:6d} MB peak RSS")
+
+def bench_volume_workers():
+    "Compare serial and process-pool parsing of volume data files."
+    with tempfile.TemporaryDirectory() as dirpath:
+        make_volume_files(dirpath, count=16, users=500)
+        expected = None
+        for workers in (None, 2, 4):
+            start = time.perf_counter()
+            records = facility_data.get_volume_data("A. Users",
+                                                    dirpath=dirpath,
+                                                    workers=workers,
+                                                    use_cache=False)
+            elapsed = time.perf_counter() - start
+            if expected is None:
+                expected = records
+            elif records != expected:
+                raise ValueError(f"workers={workers}: different records")
+            print(f"workers={workers}: {len(records)} records"
+                  f" {elapsed:8.3f} s")
+
+def best_time(function, *args, repeat=3):
+    "Return the best time in seconds of a few calls of the function."
+    result = []
+    for count in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        result.append(time.perf_counter() - start)
+    return min(result)
+
+def bench_volume_scan():
+    """Compare reading the rows of the users sheet of a volume data file
+    in chunks and in a single scan, for an increasing number of rows.
+    The time per row of the scan should be constant (linear time).
+    See 'tests/test_volume_scan.py' for the check of the records.
+    """
+    sheetname = "A. Users"
+    skip_rows_until = "Name of reporting unit"
+    with tempfile.TemporaryDirectory() as dirpath:
+        for users in (2000, 4000, 8000):
+            filepath = os.path.join(dirpath, f"users_{users}.xlsx")
+            make_volume_file(filepath, "AIDA Data Hub",
+                             users=users, rows=1, formulas=True)
+            wb = openpyxl.load_workbook(filepath)
+            ws = wb[sheetname]
+            chunked = best_time(read_volume_sheet_chunked, ws, skip_rows_until)
+            elapsed = best_time(facility_data.read_volume_sheet,
+                                ws, skip_rows_until)
+            wb.close()
+            print(f"{users:6d} rows: chunked {chunked:7.3f} s,"
+                  f" scan {elapsed:7.3f} s,"
+                  f" {1e6 * elapsed / users:6.1f} us/row")
+
+def bench_engines():
+    """Compare the openpyxl and xlsx_reader engines on the users sheet
+    of a large volume data file. Raise ValueError if the records differ.
+    """
+    sheetname = "A. Users"
+    skip_rows_until = "Name of reporting unit"
+    with tempfile.TemporaryDirectory() as dirpath:
+        filepath = os.path.join(dirpath, "users.xlsx")
+        make_volume_file(filepath, "AIDA Data Hub",
+                         users=20000, rows=50, formulas=True)
+        expected = None
+        for engine in ("openpyxl", "xlsx"):
+            elapsed = best_time(facility_data.read_volume_file,
+                                filepath, sheetname, skip_rows_until, engine)
+            records = facility_data.read_volume_file(
+                filepath, sheetname, skip_rows_until, engine)
+            if expected is None:
+                expected = records
+            elif records != expected:
+                raise ValueError(f"engine {engine}: different records")
+            print(f"{engine:10s} {len(records)} records {elapsed:8.3f} s")
+
+def merge_B_rows_nested(director_data, head_data, lookup):
+    """The previous implementation of the rows for the B file: search
+    all records ten times for each facility.
+    """
+    result = []
+    for facility, platform in lookup.items():
+        rowdata = [facility, platform]
+        for prefix, data in [("facility_director", director_data),
+                             ("facility_head", head_data)]:
+            for field in merge_B.PERSON_FIELDS:
+                values = [r[f"{prefix}: {field}"]
+                          for r in data if r["facility"] == facility]
+                if field == "Email address":
+                    values = [v for v in values if v is not None]
+                elif field == "Percent salary":
+                    values = [str(v) for v in values]
+                rowdata.append("\n".join(values))
+        result.append(rowdata)
+    return result
+
+def bench_group_units():
+    """Compare the nested loops and the grouping by unit ('group_units')
+    for the B file rows, for synthetic data with thousands of facilities
+    and people.
+    Raise ValueError if the rows differ, or if not linear.
+    """
+    per_facility = []
+    for count in (1000, 2000, 4000):
+        lookup = dict([(f"Unit {n}", f"Platform {n % 10}")
+                       for n in range(count)])
+        units = year_config.UnitResolver(lookup)
+        director_data = make_table_records("facility_director", lookup, 1)
+        head_data = make_table_records("facility_head", lookup, 2)
+        if count <= 2000:
+            nested = best_time(merge_B_rows_nested,
+                               director_data, head_data, lookup, repeat=1)
+            nested = f"{nested:8.3f} s"
+        else:
+            nested = "    skipped"
+        elapsed = best_time(merge_B.get_rows, director_data, head_data, units)
+        rows = merge_B.get_rows(director_data, head_data, units)
+        if count <= 2000:
+            if rows != merge_B_rows_nested(director_data, head_data, lookup):
+                raise ValueError("group-by rows differ from nested loops")
+        per_facility.append(elapsed / count)
+        print(f"{count:5d} facilities, {len(director_data) + len(head_data)}"
+              f" people: nested {nested}, grouped {elapsed:8.3f} s")
+    if max(per_facility) > 2 * min(per_facility):
+        raise ValueError("time per facility is not constant: not linear")
+    print("linear: OK")
+
+def join_facilities_nested(records, fields, lookup):
+    """The previous implementation of the grouping for the C and D files:
+    a nested loop join, searching all records for each facility.
+    """
+    result = []
+    for facility, platform in lookup.items():
+        rows = []
+        for record in records:
+            if record["facility"] == facility:
+                rows.append(tuple([record[field] for field in fields]))
+        result.append((facility, platform, rows))
+    return result
+
+def bench_join():
+    """Compare the nested loop join and the hash join for the C and D
+    files, for a synthetic aggregate export 100 times larger than
+    the real one. Raise ValueError if the results differ.
+    """
+    lookup = {}
+    for number in range(100):
+        for unit, platform in facility_data.PLATFORM_LOOKUP.items():
+            lookup[f"{unit} {number}"] = platform
+    units = year_config.UnitResolver(lookup)
+    for table, fields, count in [
+            ("additional_funding", merge_C.FUNDING_FIELDS, 3),
+            ("immaterial_property_rights", merge_D.IP_FIELDS, 1)]:
+        records = make_table_records(table, lookup, count)
+        # Shuffle, since the export is not sorted by facility.
+        random.Random(count).shuffle(records)
+        nested = best_time(join_facilities_nested,
+                           records, fields, lookup, repeat=1)
+        elapsed = best_time(facility_data.join_facilities,
+                            records, fields, units)
+        if (facility_data.join_facilities(records, fields, units) !=
+            join_facilities_nested(records, fields, lookup)):
+            raise ValueError(f"{table}: hash join differs from nested loop")
+        print(f"{table:28s} {len(lookup)} facilities, {len(records)} records:"
+              f" nested {nested:7.3f} s, hash join {elapsed:7.3f} s")
+
+def fig5_nested(records, facilities, affiliations):
+    """The previous implementation of the counts for figure 5: a nested
+    dictionary, looped over once for the traces and once for the CSV.
+    Return the traces and the CSV text.
+    """
+    counts = {}
+    for record in records:
+        facility = counts.setdefault(record["facility"], dict())
+        try:
+            facility[record["affiliation"]] += 1
+        except KeyError:
+            facility[record["affiliation"]] = 1
+    data = []
+    for a, affiliation in enumerate(affiliations):
+        x = []
+        y = []
+        marker_size = []
+        marker_text = []
+        for f, facility in enumerate(facilities):
+            try:
+                number = counts[facility][affiliation]
+            except KeyError:
+                pass
+            else:
+                x.append(f+1)
+                y.append(a+1)
+                marker_size.append(make_fig5.get_marker_size(number))
+                marker_text.append(f"{affiliation} / {facility}")
+        data.append({"mode": "markers",
+                     "type": "scatter",
+                     "x": x,
+                     "y": y,
+                     "marker": {"size": marker_size,
+                                "color": make_fig5.colors[a]},
+                     "text": marker_text,
+                     "name": affiliation,
+                     "hoverinfo": "text"})
+    outfile = io.StringIO()
+    writer = csv.writer(outfile)
+    writer.writerow(["Infrastructure Unit"] + affiliations)
+    for facility in facilities:
+        row = [facility]
+        for affiliation in affiliations:
+            try:
+                row.append(counts[facility][affiliation])
+            except KeyError:
+                row.append(0)
+        writer.writerow(row)
+    return data, outfile.getvalue()
+
+def fig5_matrix(records, facilities, affiliations):
+    """The count matrix for figure 5, from which the traces and
+    the CSV are made. Return the traces and the CSV text.
+    """
+    counts = make_fig5.get_counts(records, facilities, affiliations)
+    data = make_fig5.get_traces(counts)
+    with tempfile.NamedTemporaryFile("r", suffix=".csv", newline="") as outfile:
+        make_fig5.write_csv(counts, outfile.name)
+        return data, outfile.read()
+
+def bench_fig5_counts():
+    """Compare the nested dictionary and the count matrix for figure 5,
+    for synthetic data with 100 000 users and a few hundred units.
+    Raise ValueError if the traces or the CSV differ.
+    """
+    facilities = [f"Unit {n:03d}" for n in range(300)]
+    affiliations = make_fig5.AFFILIATIONS
+    rnd = random.Random(100000)
+    # Every unit and affiliation has at least one user.
+    records = [dict(facility=facility, affiliation=affiliation)
+               for facility, affiliation in zip(
+                   facilities, affiliations * len(facilities))]
+    for n in range(100000 - len(records)):
+        records.append(dict(facility=rnd.choice(facilities),
+                            affiliation=rnd.choice(affiliations)))
+    nested = best_time(fig5_nested, records, facilities, affiliations)
+    elapsed = best_time(fig5_matrix, records, facilities, affiliations)
+    if (fig5_matrix(records, facilities, affiliations) !=
+        fig5_nested(records, facilities, affiliations)):
+        raise ValueError("count matrix traces or CSV differ from nested dict")
+    print(f"{len(facilities)} facilities, {len(records)} users:"
+          f" nested {nested:7.3f} s, matrix {elapsed:7.3f} s")
+
+def merge_E_in_memory(filepath, records):
+    """The previous implementation of the E file: all rows are produced
+    first, and all cells kept in the workbook until it is closed.
+    """
+    wb = xlsxwriter.Workbook(filepath)
+    ws = wb.add_worksheet()
+    for row, rowdata in enumerate(merge_E.get_rows(records), 1):
+        ws.write_row(row, 0, rowdata)
+    wb.close()
+
+def peak_memory(function, *args):
+    "Return the peak memory in bytes allocated by Python during the call."
+    tracemalloc.start()
+    try:
+        function(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def bench_merge_E_memory():
+    """Compare the peak memory of writing the E file with all cells in
+    memory, and in the 'constant_memory' mode as the rows are produced,
+    for synthetic data with 20 000 users.
+    Raise ValueError if the cell values of the files differ.
+    """
+    rnd = random.Random(20000)
+    names = sorted(facility_data.PLATFORM_LOOKUP)
+    header = [" ".join(h.split()) for h in VOLUME_SHEETS["A. Users"]]
+    records = []
+    for n in range(20000):
+        values = [rnd.choice(names), f"reporter{n % 50}@unit.se",
+                  f"First{n}", f"Last{n}", f"pi{n}@univ.se",
+                  rnd.choice(AFFILIATIONS), None]
+        records.append(dict(zip(header, values)))
+    with tempfile.TemporaryDirectory() as dirpath:
+        previous = os.path.join(dirpath, "previous.xlsx")
+        streamed = os.path.join(dirpath, "streamed.xlsx")
+        before = peak_memory(merge_E_in_memory, previous, records)
+        after = peak_memory(merge_E.merge_E, streamed, records)
+        values = []
+        for filepath in [previous, streamed]:
+            wb = openpyxl.load_workbook(filepath, read_only=True)
+            # The same number of columns, although the extents differ.
+            values.append(list(wb.active.iter_rows(min_row=2,
+                                                   max_col=len(header)+1,
+                                                   values_only=True)))
+            wb.close()
+        if values[0] != values[1]:
+            raise ValueError("streamed E file differs from the previous")
+    print(f"{len(records)} users: in memory {before/1024/1024:6.1f} MB,"
+          f" streamed {after/1024/1024:6.1f} MB peak allocated")
+
+def make_fellows_file(filepath, rows=50):
+    """Create a synthetic fellows volume data file, where each sheet has
+    a formatted but empty cell in the last row allowed in Excel.
+    """
+    wb = xlsxwriter.Workbook(filepath)
+    blank_format = wb.add_format({'num_format': '0.00'})
+    for spec in fellows.SPECS:
+        ws = wb.add_worksheet(spec["sheetname"])
+        ws.write(0, 0, "Instructions")
+        ws.write_row(2, 0, [spec["header"]] +
+                     [f"Header {n}" for n in range(1, spec["cols"])])
+        for row in range(3, rows+3):
+            ws.write_row(row, 0, [f"Value {row} {n}"
+                                  for n in range(spec["cols"])])
+        ws.write_blank(1048575, 2, None, blank_format)
+    wb.close()
+
+def read_fellows_sheet_list(filepath, spec):
+    """The previous implementation of reading a fellows sheet: all rows
+    in memory, then the rows after the header row having a first cell.
+    """
+    wb = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
+    rows = list(wb[spec["sheetname"]].values)
+    for pos, row in enumerate(rows):
+        if row[0] == spec["header"]: break
+    result = [fellows.get_row(row, spec) for row in rows[pos+1:]
+              if row[0] is not None]
+    wb.close()
+    return result
+
+def bench_fellows_scan():
+    """Compare reading a fellows sheet having formatted rows down to the
+    last row allowed in Excel, with all rows in memory, and row by row
+    stopping after a run of empty rows.
+    Raise ValueError if the rows differ.
+    """
+    spec = fellows.SPECS[1]
+    with tempfile.TemporaryDirectory() as dirpath:
+        filepath = os.path.join(dirpath, "fellow.xlsx")
+        make_fellows_file(filepath)
+        start = time.perf_counter()
+        before = peak_memory(read_fellows_sheet_list, filepath, spec)
+        before_time = time.perf_counter() - start
+        start = time.perf_counter()
+        after = peak_memory(fellows.read_file, filepath, [spec])
+        after_time = time.perf_counter() - start
+        if (read_fellows_sheet_list(filepath, spec) !=
+            fellows.read_file(filepath, [spec])[spec["name"]][1]):
+            raise ValueError("fellows rows differ from the previous")
+    print(f"all rows {before_time:7.3f} s {before/1024/1024:6.1f} MB,"
+          f" row by row {after_time:7.3f} s {after/1024/1024:6.1f} MB"
+          " peak allocated")
+
+def read_volume_file_unbounded(filepath, sheetname, skip_rows_until, engine):
+    """The previous implementation of reading a volume data sheet: all
+    columns of the declared extent of the sheet.
+    """
+    wb = facility_data.open_workbook(filepath, engine)
+    try:
+        return facility_data.scan_volume_rows(wb.iter_rows(sheetname),
+                                              skip_rows_until)
+    finally:
+        wb.close()
+
+def bench_volume_extent():
+    """Compare reading the users sheet of a volume data file having
+    a formatted but empty cell in the last row and column allowed in Excel,
+    within its declared extent, and within the extent of its data.
+    Raise ValueError if the records differ, or if the extent is not logged.
+    """
+    sheetname = "A. Users"
+    skip_rows_until = "Name of reporting unit"
+    with tempfile.TemporaryDirectory() as dirpath:
+        filepath = os.path.join(dirpath, "users.xlsx")
+        make_volume_file(filepath, "AIDA Data Hub", users=200, rows=1)
+        # Add the formatted cell to the users sheet.
+        wb = openpyxl.load_workbook(filepath)
+        wb[sheetname].cell(1048576, 16384).number_format = "0.00"
+        wb.save(filepath)
+        wb.close()
+        wb = facility_data.open_workbook(filepath, "xlsx")
+        dimension = wb.get_dimension(sheetname)
+        wb.close()
+        if not facility_data.check_extent("users.xlsx", sheetname,
+                                          dimension, 204):
+            raise ValueError(f"extent {dimension} not logged")
+        for engine in ("openpyxl", "xlsx"):
+            before = best_time(read_volume_file_unbounded,
+                               filepath, sheetname, skip_rows_until, engine,
+                               repeat=1)
+            after = best_time(facility_data.read_volume_file,
+                              filepath, sheetname, skip_rows_until, engine,
+                              repeat=1)
+            if (read_volume_file_unbounded(filepath, sheetname,
+                                           skip_rows_until, engine) !=
+                facility_data.read_volume_file(filepath, sheetname,
+                                               skip_rows_until, engine)):
+                raise ValueError(f"engine {engine}: records differ")
+            print(f"{engine:10s} declared extent {before:8.3f} s,"
+                  f" data extent {after:8.3f} s")
+
+def lookup_unit_fallback(name, lookup, lookup_lower, aliases):
+    """The previous implementation of the unit lookup in the merges:
+    strip, rename an alias, and on KeyError retry in lower case.
+    """
+    name = name.strip()
+    name = aliases.get(name, name)
+    try:
+        return name, lookup[name]
+    except KeyError:
+        return lookup_lower[name.lower()]
+
+def bench_unit_resolver():
+    """Compare the previous unit lookup and the UnitResolver for the unit
+    names of a large users sheet, with wrong character case and extra
+    white-space. Raise ValueError if the results differ where the previous
+    lookup succeeds, or if the resolver fails for any name.
+    """
+    config = facility_data.CONFIG
+    lookup = config.platform_lookup
+    lookup_lower = dict([(k.lower(), (k, v)) for k, v in lookup.items()])
+    rnd = random.Random(24)
+    names = []
+    for unit in sorted(lookup):
+        names.extend([unit, f" {unit} ", unit.upper(), unit.lower(),
+                      unit.replace(" ", "  ", 1), unit.replace(" ", "\xa0")])
+    names = [rnd.choice(names) for count in range(200000)]
+    failed = 0
+    start = time.perf_counter()
+    for name in names:
+        try:
+            lookup_unit_fallback(name, lookup, lookup_lower,
+                                 config.unit_aliases)
+        except KeyError:
+            failed += 1
+    before = time.perf_counter() - start
+    units = year_config.UnitResolver(lookup, config.unit_aliases)
+    start = time.perf_counter()
+    for name in names:
+        units.resolve(name)
+    after = time.perf_counter() - start
+    for name in set(names):
+        try:
+            expected = lookup_unit_fallback(name, lookup, lookup_lower,
+                                            config.unit_aliases)
+        except KeyError:
+            continue
+        if units.resolve(name) != expected:
+            raise ValueError(f"'{name}': {units.resolve(name)} != {expected}")
+    print(f"{len(names)} names: fallback {before:7.3f} s"
+          f" ({failed} not found), resolver {after:7.3f} s")
+
+def to_iso_inline(value):
+    """The previous implementation of the date conversion for the F file,
+    made inline for each date of each row.
+    """
+    if isinstance(value, datetime.datetime):
+        return value.strftime("%Y-%m-%d")
+    elif isinstance(value, int):
+        year = value // 10000
+        month = value // 100 % 100
+        day = value % 100
+        return f"{year:4d}-{month:02d}-{day:02d}"
+    elif isinstance(value, str):
+        if "/" in value:
+            return "-".join(reversed(value.split("/")))
+        return value
+    else:
+        raise ValueError(f"unknown date '{value}' type '{type(value)}'")
+
+def bench_dates():
+    """Compare the inline conversion of each date, and the normalization
+    of a column of dates at once, for a large column of dates given as
+    'datetime' instances, ints and strings. Raise ValueError if the dates
+    differ, or if the report is wrong.
+    """
+    rnd = random.Random(25)
+    days = [datetime.datetime(2022, 1, 1) + datetime.timedelta(days=n)
+            for n in range(365)]
+    values = []
+    for count in range(200000):
+        day = rnd.choice(days)
+        form = rnd.randrange(10)
+        if form == 0:
+            values.append(int(day.strftime("%Y%m%d")))
+        elif form == 1:
+            values.append(day.strftime("%d/%m/%Y"))
+        elif form == 2:
+            values.append(day.strftime("%Y-%m-%d"))
+        else:
+            values.append(day)
+    start = time.perf_counter()
+    expected = [to_iso_inline(value) for value in values]
+    before = time.perf_counter() - start
+    start = time.perf_counter()
+    result, report = dates.normalize(values, "dates", required=True)
+    after = time.perf_counter() - start
+    if result != expected:
+        raise ValueError("normalized dates differ from inline conversion")
+    coerced = len([v for v in values if isinstance(v, int)
+                   or (isinstance(v, str) and "/" in v)])
+    if report.invalid or sum(report.coerced.values()) != coerced:
+        raise ValueError(f"wrong report: {report}")
+    print(f"{len(values)} dates: inline {before:7.3f} s,"
+          f" column {after:7.3f} s")
+    print(report)
+
+BENCHMARKS = {
+    "read_file": bench_read_file,
+    "volume_workers": bench_volume_workers,
+    "volume_scan": bench_volume_scan,
+    "engines": bench_engines,
+    "group_units": bench_group_units,
+    "join": bench_join,
+    "fig5_counts": bench_fig5_counts,
+    "merge_E_memory": bench_merge_E_memory,
+    "fellows_scan": bench_fellows_scan,
+    "volume_extent": bench_volume_extent,
+    "unit_resolver": bench_unit_resolver,
+    "dates": bench_dates,
+}
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        run_child(*sys.argv[2:4])
+    else:
+        for name in sys.argv[1:] or BENCHMARKS:
+            print(f"--- {name}")
+            BENCHMARKS[name]()
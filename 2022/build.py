@@ -0,0 +1,212 @@
+"""Infrastructure Units Reports 2022.
+
+Create only those merged files A-H, and the figure 5, whose inputs have
+changed since the last build. The inputs of each file are the input data
+files it is created from, and the Python source files creating it.
+Their fingerprints (contents digest) are recorded in a JSON file in the
+directory of the merged files after each build, together with the output
+mode of each merged file: with or without styling, and the columnar file.
+
+    $ python build.py [--force] [--dry-run] [--workers N] [--engine xlsx] [--parquet|--arrow]
+
+NOTE: Any change in a volume data file, or any added or removed file,
+means that all of E, F, G and H are created again, since each of them
+contains data from all units. The cache of parsed input files ensures
+that only the changed volume data files are actually parsed again.
+"""
+
+import argparse
+import glob
+import json
+import os
+import os.path
+
+import columnar
+import dates
+import facility_data
+import make_fig5
+import output
+import pipeline
+
+### Path to the file recording the fingerprints of the inputs at the last build.
+STATE_FILEPATH = os.path.join(facility_data.BASEDIRPATH,
+                              "merged_files",
+                              "build_state.json")
+
+# The aggregate file for each name of aggregate data in the pipeline.
+AGGREGATE_FILEPATHS = {
+    "report": facility_data.REPORT_FILEPATH,
+    "director": facility_data.FACILITY_DIRECTOR_FILEPATH,
+    "head": facility_data.FACILITY_HEAD_FILEPATH,
+    "funding": facility_data.ADDITIONAL_FUNDING_FILEPATH,
+    "ip": facility_data.IP_RIGHTS_FILEPATH,
+}
+
+# The configuration file for the year.
+YEAR_CONFIG_FILEPATH = os.path.join(facility_data.year_config.YEARSDIRPATH,
+                                    f"{facility_data.YEAR}.json")
+
+# The Python source files, and the configuration for the year,
+# which all merged files depend on.
+SOURCE_FILEPATHS = [facility_data.__file__,
+                    facility_data.xlsx_reader.__file__,
+                    facility_data.year_config.__file__,
+                    output.__file__,
+                    columnar.__file__,
+                    YEAR_CONFIG_FILEPATH]
+
+# The shared Python source files which only some merged files depend on.
+TARGET_SOURCE_FILEPATHS = {
+    "F": [dates.__file__],
+    "G": [dates.__file__],
+}
+
+FIG5 = pipeline.FIG5
+
+
+def get_output(target):
+    "Get the path of the output file for the target."
+    if target == FIG5:
+        return make_fig5.OUTPUTFILENAME + ".png"
+    return facility_data.CONFIG.get_merged_filepath(target)
+
+def get_inputs(target):
+    "Get the paths of the input files for the target, in sorted order."
+    if target == FIG5:
+        # The facilities of the figure are given by the configuration.
+        result = [get_output("E"),
+                  make_fig5.__file__,
+                  make_fig5.merge_E.__file__,
+                  make_fig5.render.__file__,
+                  make_fig5.scilifelab_brand_colors.__file__,
+                  facility_data.__file__,
+                  facility_data.year_config.__file__,
+                  YEAR_CONFIG_FILEPATH]
+        return sorted([os.path.abspath(p) for p in result])
+    module, merge, inputs = pipeline.TARGETS[target]
+    result = SOURCE_FILEPATHS + [module.__file__]
+    result.extend(TARGET_SOURCE_FILEPATHS.get(target, []))
+    for name in inputs:
+        if name in AGGREGATE_FILEPATHS:
+            result.append(AGGREGATE_FILEPATHS[name])
+        else:
+            result.extend(glob.glob(f"{facility_data.VOLDIRPATH}/*.xls[mx]"))
+    return sorted([os.path.abspath(p) for p in set(result)])
+
+def get_fingerprints(target, data_only=False, columnar_format=None):
+    """Get the current fingerprints of the inputs of the target.
+    Return a dictionary with the file path as key and the digest as value.
+    For a merged file, the output mode is also given, with key 'output mode'.
+    """
+    result = dict([(filepath, facility_data.file_fingerprint(filepath)[2])
+                   for filepath in get_inputs(target)])
+    if target != FIG5:
+        result["output mode"] = get_output_mode(data_only, columnar_format)
+    return result
+
+def get_output_mode(data_only=False, columnar_format=None):
+    """Get the output mode of the merged files: 'styled' or 'data-only',
+    followed by the columnar format, if any.
+    """
+    mode = "data-only" if data_only else "styled"
+    if columnar_format:
+        mode += f" {columnar_format}"
+    return mode
+
+def is_outdated(target, state, data_only=False, columnar_format=None):
+    """Is the output file for the target missing, or has any of its inputs
+    been added, removed or changed since the last build, or was it
+    created in another output mode?
+    """
+    if not os.path.exists(get_output(target)): return True
+    # The columnar file, if asked for, is also an output of a merged file.
+    if columnar_format and target != FIG5:
+        if not os.path.exists(columnar.get_filepath(get_output(target),
+                                                    columnar_format)):
+            return True
+    return state.get(target) != get_fingerprints(target, data_only,
+                                                 columnar_format)
+
+def load_state():
+    "Load the fingerprints recorded at the last build."
+    try:
+        with open(STATE_FILEPATH) as infile:
+            return json.load(infile)
+    except (OSError, ValueError):
+        return {}
+
+def save_state(state):
+    "Save the fingerprints of the inputs of the built targets."
+    with open(STATE_FILEPATH, "w") as outfile:
+        json.dump(state, outfile, indent=2)
+
+def build(force=False, dry_run=False, workers=None,
+          engine=facility_data.ENGINE, use_cache=True, data_only=False,
+          columnar_format=None):
+    """Create the merged files and the figure which are outdated.
+    See 'pipeline.run' for the options.
+    Return the list of the targets that were created.
+    """
+    state = load_state()
+    targets = [t for t in pipeline.TARGETS
+               if force or is_outdated(t, state, data_only, columnar_format)]
+    # The figure is made from the E file, or the rows when creating it.
+    if force or "E" in targets or is_outdated(FIG5, state):
+        targets.append(FIG5)
+    if dry_run or not targets:
+        return targets
+    # Get the fingerprints before, since the files may change meanwhile.
+    fingerprints = dict([(t, get_fingerprints(t, data_only, columnar_format))
+                         for t in targets if t != FIG5])
+    pipeline.run(targets,
+                 workers=workers,
+                 engine=engine,
+                 use_cache=use_cache,
+                 data_only=data_only,
+                 columnar_format=columnar_format).print()
+    # The figure depends on the E file, which has just been created.
+    if FIG5 in targets:
+        fingerprints[FIG5] = get_fingerprints(FIG5)
+    state.update(fingerprints)
+    save_state(state)
+    return targets
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--force", action="store_true",
+                        help="create all files, regardless of changes")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="only show which files would be created")
+    parser.add_argument("--workers", type=int,
+                        default=facility_data.WORKERS,
+                        help="number of processes for the volume data files")
+    parser.add_argument("--engine", choices=["openpyxl", "xlsx"],
+                        default=facility_data.ENGINE,
+                        help="engine for reading XLSX files")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="do not use the cache of parsed input files")
+    parser.add_argument("--data-only", action="store_true",
+                        help="write the merged files without any styling")
+    # Only one columnar format can be written.
+    formats = parser.add_mutually_exclusive_group()
+    formats.add_argument("--parquet", action="store_true",
+                         help="also write each merged file as a Parquet file")
+    formats.add_argument("--arrow", action="store_true",
+                         help="also write each merged file as an Arrow IPC"
+                         " file")
+    args = parser.parse_args()
+    columnar_format = columnar.get_format(args)
+    if columnar_format and columnar.pyarrow is None:
+        parser.error("the 'pyarrow' package is needed for columnar files")
+    targets = build(force=args.force,
+                    dry_run=args.dry_run,
+                    workers=args.workers,
+                    engine=args.engine,
+                    use_cache=not args.no_cache,
+                    data_only=args.data_only,
+                    columnar_format=columnar_format)
+    if args.dry_run:
+        print("Would create:", " ".join(targets) or "nothing")
+    else:
+        print("Created:", " ".join(targets) or "nothing; all up to date")
@@ -0,0 +1,91 @@
+"""Write the rows of a merged file also as a columnar file, in addition
+to the XLSX file, for analysis by other tools.
+
+The columnar file is written only if a format is given; the scripts
+creating merged files give it by the command line option '--parquet'
+or '--arrow', of which only one may be given. The Apache Parquet
+file is compressed, while the Arrow IPC file can be memory-mapped by
+the reader without being parsed.
+The columnar file has the same name as the XLSX file, with the extension
+'.parquet' or '.arrow'. The column names are the headers of the XLSX file.
+All merged files A-H, and the fellows files, can be written this way.
+
+This requires the package 'pyarrow', which is not needed otherwise.
+"""
+
+import os.path
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+### The file name extension for each columnar format.
+EXTENSIONS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+
+def get_format(args):
+    """Get the columnar format given by the parsed command line options
+    '--parquet' or '--arrow'; None if neither.
+    """
+    return ([f for f in EXTENSIONS if getattr(args, f, False)] or [None])[0]
+
+def get_filepath(filepath, format):
+    "Get the path of the columnar file in the format for the XLSX file."
+    return os.path.splitext(filepath)[0] + EXTENSIONS[format]
+
+def get_table(header, rows):
+    """Get the Arrow table for the header and the rows.
+    A column having values of different types, such as dates given as
+    both strings and numbers, is converted to a column of strings.
+    """
+    if pyarrow is None:
+        raise ValueError("the 'pyarrow' package is not installed")
+    columns = [[] for name in header]
+    for row in rows:
+        for column, value in zip(columns, row):
+            column.append(value)
+    arrays = []
+    for column in columns:
+        try:
+            arrays.append(pyarrow.array(column))
+        except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError):
+            arrays.append(pyarrow.array(
+                [None if v is None else str(v) for v in column]))
+    # Column names must be strings, and unique.
+    names = []
+    for pos, name in enumerate(header):
+        name = str(name or pos)
+        while name in names:
+            name += "_"
+        names.append(name)
+    return pyarrow.Table.from_arrays(arrays, names=names)
+
+def write(filepath, header, rows, format=None):
+    """Write the columnar file for the XLSX file path, in the given format.
+    Do nothing if no format. Return the path of the columnar file,
+    or None if not written.
+    """
+    if not format: return None
+    table = get_table(header, rows)
+    filepath = get_filepath(filepath, format)
+    if format == "parquet":
+        pyarrow.parquet.write_table(table, filepath)
+    else:
+        with pyarrow.OSFile(filepath, "wb") as outfile:
+            with pyarrow.ipc.new_file(outfile, table.schema) as writer:
+                writer.write_table(table)
+    return filepath
+
+def read(filepath):
+    """Read the Arrow table from the columnar file, memory-mapped.
+    The values are not read until used.
+    """
+    if pyarrow is None:
+        raise ValueError("the 'pyarrow' package is not installed")
+    if filepath.endswith(EXTENSIONS["parquet"]):
+        return pyarrow.parquet.read_table(filepath, memory_map=True)
+    else:
+        return pyarrow.ipc.open_file(pyarrow.memory_map(filepath)).read_all()
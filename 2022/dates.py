@@ -0,0 +1,124 @@
+"""Normalize the dates in the volume data files to ISO dates 'yyyy-mm-dd'.
+
+The dates are entered in many ways in the volume data files. Most of
+the time they are read as 'datetime' instances, but sometimes as an 'int'
+yyyymmdd, or as a string; either ISO, or 'dd/mm/yyyy'. A whole column of
+dates is normalized in one pass, each distinct value being converted only
+once, and a report is made of the values of the column which had to be
+coerced from another form, and of those which are invalid.
+
+Used for the F and G files, and for the teaching dates of the fellows.
+"""
+
+import datetime
+
+# The output format.
+ISO = "%Y-%m-%d"
+
+# The formats of dates given as strings, and the name of each in reports.
+# The ISO format must be first.
+STRING_FORMATS = [(ISO, "string"),
+                  ("%d/%m/%Y", "dd/mm/yyyy"),
+                  ("%Y/%m/%d", "yyyy/mm/dd")]
+
+
+class Report:
+    "The values of a column of dates which were coerced, or are invalid."
+
+    def __init__(self, name=None):
+        self.name = name
+        # The number of values coerced from each form.
+        self.coerced = {}
+        # Tuples (row number in the column, value).
+        self.invalid = []
+
+    def __bool__(self):
+        return bool(self.coerced or self.invalid)
+
+    def __str__(self):
+        parts = []
+        if self.coerced:
+            parts.append("coerced " + ", ".join(
+                [f"{count} {kind}"
+                 for kind, count in sorted(self.coerced.items())]))
+        if self.invalid:
+            values = ", ".join([f"row {pos} {value!r}"
+                                for pos, value in self.invalid[:10]])
+            if len(self.invalid) > 10:
+                values += ", ..."
+            parts.append(f"invalid {len(self.invalid)}: {values}")
+        return f"{self.name}: {'; '.join(parts) or 'OK'}"
+
+
+def normalize(values, name=None, required=False, empty=""):
+    """Convert the column of values to ISO dates in one pass.
+    A missing value is given the 'empty' value; it is invalid if the
+    column is 'required'. An invalid value is kept, as a string.
+    Return a tuple (list of dates, Report for the column).
+    """
+    report = Report(name)
+    result = []
+    converted = {}
+    for pos, value in enumerate(values, 1):
+        try:
+            date, kind = converted[value]
+        except KeyError:
+            try:
+                date, kind = convert(value)
+            except ValueError:
+                date, kind = (value, "invalid")
+            converted[value] = (date, kind)
+        if kind is None:
+            pass
+        elif kind == "missing":
+            date = empty
+            if required:
+                report.invalid.append((pos, value))
+        elif kind == "invalid":
+            report.invalid.append((pos, value))
+            date = str(value)
+        else:
+            report.coerced[kind] = report.coerced.get(kind, 0) + 1
+        result.append(date)
+    return result, report
+
+def convert(value):
+    """Convert the value to an ISO date. Return a tuple (date, kind), where
+    the kind is the form coerced from; None if already a date or ISO date,
+    and 'missing' if there is no value.
+    Raise ValueError if not a valid date.
+    """
+    if value is None:
+        return (None, "missing")
+    # A 'datetime' instance is also a 'date' instance.
+    elif isinstance(value, datetime.date):
+        return (value.strftime(ISO), None)
+    elif isinstance(value, int) and not isinstance(value, bool):
+        date = datetime.datetime.strptime(str(value), "%Y%m%d")
+        return (date.strftime(ISO), "int")
+    elif isinstance(value, str):
+        value = value.strip()
+        if not value:
+            return (None, "missing")
+        for format, kind in STRING_FORMATS:
+            try:
+                date = datetime.datetime.strptime(value, format)
+            except ValueError:
+                continue
+            date = date.strftime(ISO)
+            if date == value:
+                return (date, None)
+            else:
+                return (date, kind)
+    raise ValueError(f"invalid date {value!r}")
+
+def normalize_records(records, key, required=False, empty=""):
+    """Convert the dates of the column given by the key in the records
+    to ISO dates; see 'normalize'. The report for the column is printed,
+    if any value was coerced or is invalid. Return the list of dates.
+    """
+    result, report = normalize([record.get(key) for record in records],
+                               key, required=required, empty=empty)
+    if report:
+        print(report)
+    return result
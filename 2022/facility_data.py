@@ -9,197 +9,406 @@ The files were created in and downloaded from the Reporting Portal
 Reporting Portal https://reporting.scilifelab.se/
 """
 
+import concurrent.futures
+import functools
 import glob
+import hashlib
+import itertools
+import os
 import os.path
+import pickle
+import tempfile
 import unicodedata
+import zlib
 
 import openpyxl
 
-BASEDIRPATH = os.path.expanduser("~/Nextcloud/Årsrapport 2022/Units reports")
-BASEFILENAME = f"orders_Infrastructure_Unit_report_2022"
+import xlsx_reader
+import year_config
+
+### The year of the reports; see 'year_config.py' and 'years/{YEAR}.json'.
+YEAR = 2022
+
+# The configuration of the reports for the year.
+CONFIG = year_config.load(YEAR)
+
+BASEDIRPATH = CONFIG.basedirpath
+BASEFILENAME = CONFIG.basefilename
 
 ### Path to directory containing the downloaded aggregate files.
-DIRPATH = os.path.join(BASEDIRPATH, "aggregate_files")
+DIRPATH = CONFIG.dirpath
 
 ### Path to directory containing the downloaded volume data files.
-VOLDIRPATH = os.path.join(BASEDIRPATH, "volume_data_files")
+VOLDIRPATH = CONFIG.voldirpath
+
+### Number of worker processes for parsing the volume data files.
+### None means parse them one at a time in this process.
+WORKERS = None
+
+### Engine for reading the XLSX files: "openpyxl", or "xlsx" for
+### the module 'xlsx_reader', which streams the sheet XML directly.
+ENGINE = "openpyxl"
+
+### Path to the local directory of the caches of the current user;
+### set by the environment variable KTH_REPORT_CACHE, if given.
+### It must never be a shared or synced directory, since the cache
+### files are loaded as pickles, which may execute code.
+CACHEBASEDIRPATH = (os.environ.get("KTH_REPORT_CACHE") or
+                    os.path.join(os.environ.get("XDG_CACHE_HOME") or
+                                 os.path.expanduser("~/.cache"),
+                                 "kth_report"))
+
+### Path to directory containing the cache of parsed input files.
+CACHEDIRPATH = os.path.join(CACHEBASEDIRPATH, "parsed")
+
+### Max total size of the cache files, in bytes. When exceeded,
+### the least recently used cache files are removed.
+CACHE_MAX_SIZE = 500 * 1024 * 1024
+
+### A Volume data sheet may declare an extent (its 'dimension') much
+### larger than its data, from formatting applied to whole columns or rows.
+### The columns beyond this number are never read, and the extent is logged
+### when it exceeds the data by more than this number of rows. Within that
+### number of rows after the data, any stray data which is not read is logged.
+MAX_COLUMNS = 200
+PHANTOM_ROWS = 1000
+
+### Change this whenever the records produced by the readers change,
+### to make the cached records obsolete.
+READER_VERSION = "2"
 
 
 # Lookup from unit name to platform name.
-# Information from the file "Reporting Units 2022.xlsx"
-PLATFORM_LOOKUP = {
-    "AIDA Data Hub": "Bioinformatics",
-    "BioImage Informatics" : "Bioinformatics",
-    "Compute and Storage" : "Bioinformatics",
-    "Support, Infrastructure and Training" : "Bioinformatics",
-
-    "Ancient DNA" : "Genomics",
-    "Microbial Single Cell Genomics" : "Genomics",
-    "National Genomics Infrastructure" : "Genomics",
-
-    "Clinical Genomics Gothenburg" : "Clinical Genomics",
-    "Clinical Genomics Linköping" : "Clinical Genomics",
-    "Clinical Genomics Lund" : "Clinical Genomics",
-    "Clinical Genomics Stockholm" : "Clinical Genomics",
-    "Clinical Genomics Umeå" : "Clinical Genomics",
-    "Clinical Genomics Uppsala" : "Clinical Genomics",
-    "Clinical Genomics Örebro" : "Clinical Genomics",
-
-    "Affinity Proteomics Stockholm" : "Clinical Proteomics and Immunology",
-    "Affinity Proteomics Uppsala" : "Clinical Proteomics and Immunology",
-    "Autoimmunity and Serology Profiling" : "Clinical Proteomics and Immunology",
-    "Cellular Immunomonitoring" : "Clinical Proteomics and Immunology",
-    "Global Proteomics and Proteogenomics" : "Clinical Proteomics and Immunology",
-    "Glycoproteomics" : "Clinical Proteomics and Immunology",
-
-    "Exposomics" : "Metabolomics",
-    "Swedish Metabolomics Centre" : "Metabolomics",
-
-    "Advanced FISH Technologies" : "Spatial and Single Cell Biology",
-    "Eukaryotic Single Cell Genomics" : "Spatial and Single Cell Biology",
-    "In Situ Sequencing" : "Spatial and Single Cell Biology",
-    "Spatial Mass Spectrometry" : "Spatial and Single Cell Biology",
-    "Spatial Proteomics" : "Spatial and Single Cell Biology",
-
-    "Cryo-EM" : "Cellular and Molecular Imaging",
-    "Integrated Microscopy Technologies Gothenburg" : "Cellular and Molecular Imaging",
-    "Integrated Microscopy Technologies Stockholm" : "Cellular and Molecular Imaging",
-    "Integrated Microscopy Technologies Umeå" : "Cellular and Molecular Imaging",
-
-    "Structural Proteomics" : "Integrated Structural Biology",
-    "Swedish NMR Centre" : "Integrated Structural Biology",
-
-    "Chemical Biology Consortium Sweden" : "Chemical Biology and Genome Engineering",
-    "Chemical Proteomics" : "Chemical Biology and Genome Engineering",
-    "CRISPR Functional Genomics" : "Chemical Biology and Genome Engineering",
-
-    "Drug Discovery and Development" : "Drug Discovery and Development",
-}
-
-# Handle strange cases where unit name has wrong character case.
-PLATFORM_LOOKUP_LOWER = dict([(k.lower(), (k, v))
-                              for k, v in PLATFORM_LOOKUP.items()])
-
-REPORT_FILEPATH = os.path.join(DIRPATH, f"{BASEFILENAME}.xlsx")
-
-def get_report_data(filepath=REPORT_FILEPATH):
+PLATFORM_LOOKUP = CONFIG.platform_lookup
+
+# Resolve the unit names in the input files; see 'year_config.py'.
+UNITS = CONFIG.units
+
+REPORT_FILEPATH = CONFIG.get_aggregate_filepath()
+
+def get_report_data(filepath=REPORT_FILEPATH, engine=ENGINE,
+                    use_cache=True):
     """Get the data reported in single-valued fields of the
     OrderPortal form.
     """
-    return read_file(filepath)
+    return read_file(filepath, engine, use_cache)
 
-FACILITY_HEAD_FILEPATH = os.path.join(
-    DIRPATH, f"{BASEFILENAME}_facility_head.xlsx")
+FACILITY_HEAD_FILEPATH = CONFIG.get_aggregate_filepath("facility_head")
 
-def get_facility_head_data(filepath=FACILITY_HEAD_FILEPATH):
+def get_facility_head_data(filepath=FACILITY_HEAD_FILEPATH, engine=ENGINE,
+                           use_cache=True):
     """Get the facility head data.
     """
-    return read_file(filepath)
+    return read_file(filepath, engine, use_cache)
 
-FACILITY_DIRECTOR_FILEPATH = os.path.join(
-    DIRPATH, f"{BASEFILENAME}_facility_director.xlsx")
+FACILITY_DIRECTOR_FILEPATH = CONFIG.get_aggregate_filepath("facility_director")
 
-def get_facility_director_data(filepath=FACILITY_DIRECTOR_FILEPATH):
+def get_facility_director_data(filepath=FACILITY_DIRECTOR_FILEPATH, engine=ENGINE,
+                               use_cache=True):
     """Get the facility director data.
     """
-    return read_file(filepath)
+    return read_file(filepath, engine, use_cache)
 
-ADDITIONAL_FUNDING_FILEPATH = os.path.join(
-    DIRPATH, f"{BASEFILENAME}_additional_funding.xlsx")
+ADDITIONAL_FUNDING_FILEPATH = CONFIG.get_aggregate_filepath("additional_funding")
 
-def get_additional_funding_data(filepath=ADDITIONAL_FUNDING_FILEPATH):
+def get_additional_funding_data(filepath=ADDITIONAL_FUNDING_FILEPATH, engine=ENGINE,
+                                use_cache=True):
     """Get the additional funding data.
     """
-    return read_file(filepath)
+    return read_file(filepath, engine, use_cache)
 
-IP_RIGHTS_FILEPATH = os.path.join(
-    DIRPATH, f"{BASEFILENAME}_immaterial_property_rights.xlsx")
+IP_RIGHTS_FILEPATH = CONFIG.get_aggregate_filepath("immaterial_property_rights")
 
-def get_ip_rights_data(filepath=IP_RIGHTS_FILEPATH):
+def get_ip_rights_data(filepath=IP_RIGHTS_FILEPATH, engine=ENGINE,
+                       use_cache=True):
     """Get the immaterial_propery_rights data."""
-    return read_file(filepath)
+    return read_file(filepath, engine, use_cache)
 
-def read_file(filepath):
+def read_file(filepath, engine=ENGINE, use_cache=True):
     """Open the Excel file given by the path and read the first sheet.
     Return a list of dictionaries, one for each row.
+    The records are taken from the cache if 'use_cache' and possible.
     """
-    wb = openpyxl.load_workbook(filename=filepath)
-    rows = list(wb.active)
-    wb.close()
-    header = [c.value.strip() for c in rows[0]]
-    return [dict(list(zip(header, [c.value for c in row])))
-            for row in rows[1:]]
+    result = cache_load(filepath, "") if use_cache else None
+    if result is None:
+        result = list(iter_file(filepath, engine))
+        if use_cache:
+            cache_store(filepath, "", result)
+    return result
+
+def iter_file(filepath, engine=ENGINE):
+    """Open the Excel file given by the path in read-only mode and
+    stream the rows of the first sheet. Yield one dictionary for each row.
+    No cell objects are kept; only the values of the current row.
+    A row shorter than the header, as may be read from a sheet not
+    declaring its extent, has None for the missing values.
+    """
+    wb = open_workbook(filepath, engine, read_only=True)
+    try:
+        rows = wb.iter_rows()
+        header = next(rows, None)
+        if header is None: return
+        header = [v.strip() for v in header]
+        for row in rows:
+            if len(row) < len(header):
+                row = list(row) + [None] * (len(header) - len(row))
+            yield dict(zip(header, row))
+    finally:
+        wb.close()
+
+def group_units(records, units=UNITS, key="facility"):
+    """Group the records by the proper name of their unit, in one pass.
+    The unit names are resolved by the UnitResolver; records for no known
+    unit are skipped. Return a dictionary with the proper name as key,
+    and the list of records having that unit as value. The records keep
+    their original order.
+    """
+    result = {}
+    for record in records:
+        try:
+            facility = units.resolve(record[key])[0]
+        except KeyError:
+            continue
+        try:
+            result[facility].append(record)
+        except KeyError:
+            result[facility] = [record]
+    return result
+
+def join_facilities(records, fields, units=UNITS):
+    """Join the records to the facilities of the UnitResolver (a hash join),
+    grouping the records by facility in one pass.
+    Return a list of tuples (facility, platform, rows) in the order of
+    the platform lookup, where 'rows' is a list of tuples of the values for
+    the fields in the records for the facility, in their original order.
+    """
+    groups = group_units(records, units)
+    result = []
+    for facility, platform in units.platform_lookup.items():
+        rows = [tuple([record[field] for field in fields])
+                for record in groups.get(facility, [])]
+        result.append((facility, platform, rows))
+    return result
 
-def get_volume_data(sheetname, dirpath=VOLDIRPATH):
+def get_volume_data(sheetname, dirpath=VOLDIRPATH, workers=WORKERS,
+                    engine=ENGINE, use_cache=True):
     """Get all data records for a specified sheet for each unit.
     Returns list of dictionaries, where each dictionary is one row.
+    If 'workers' is given, the files are parsed in that many processes.
+    The records are in the sorted file order in either case.
+    """
+    return get_volume_sheets([sheetname], dirpath, workers, engine,
+                             use_cache)[sheetname]
+
+def get_volume_sheets(sheetnames, dirpath=VOLDIRPATH, workers=WORKERS,
+                      engine=ENGINE, use_cache=True):
+    """Get all data records for each of the specified sheets for each unit.
+    Each volume data file is opened and parsed only once, unless its
+    sheets are taken from the cache, if 'use_cache'.
+    Returns a dictionary with the sheet name as key and the list of
+    records for all units as value.
     """
     skip_rows_until = "Name of reporting unit"
-    result = []
-    for filepath in sorted(glob.glob(f"{dirpath}/*.xls[mx]")):
-        try:
-            records = read_volume_file(filepath, sheetname, skip_rows_until)
-            result.extend(records)
-            print(os.path.basename(filepath), len(records))
-        except KeyError as error:
-            print(os.path.basename(filepath), error)
-            raise
+    filepaths = sorted(glob.glob(f"{dirpath}/*.xls[mx]"))
+
+    # Get the sheets from the cache where possible. A file is parsed
+    # if any of the sheets is missing from the cache.
+    cached = {}
+    for filepath in filepaths:
+        if not use_cache: break
+        sheets = {}
+        for sheetname in sheetnames:
+            records = cache_load(filepath, sheetname)
+            if records is None: break
+            sheets[sheetname] = records
+        else:
+            cached[filepath] = sheets
+    parsed = map_files(read_volume_sheets,
+                       [f for f in filepaths if f not in cached],
+                       sheetnames, skip_rows_until, engine,
+                       workers=workers)
+
+    result = dict([(sheetname, []) for sheetname in sheetnames])
+    for filepath in filepaths:
+        if filepath in cached:
+            sheets = cached[filepath]
+        else:
+            sheets = next(parsed)[1]
+            if use_cache:
+                for sheetname, records in sheets.items():
+                    cache_store(filepath, sheetname, records)
+        for sheetname, records in sheets.items():
+            result[sheetname].extend(records)
+        print(os.path.basename(filepath),
+              ", ".join([str(len(r)) for r in sheets.values()]))
     return result
 
-def read_volume_file(filepath, sheetname, skip_rows_until):
+def map_files(function, filepaths, *args, workers=None):
+    """Call the function for each file path, with the additional arguments.
+    Yield tuples (filepath, result) in the order of the file paths.
+    If 'workers' is given, the calls are done in a pool of that many
+    processes. A KeyError is printed with the name of the file, and raised.
+    """
+    if workers:
+        executor = concurrent.futures.ProcessPoolExecutor(workers)
+        calls = [executor.submit(function, filepath, *args).result
+                 for filepath in filepaths]
+    else:
+        executor = None
+        calls = [functools.partial(function, filepath, *args)
+                 for filepath in filepaths]
+    try:
+        for filepath, call in zip(filepaths, calls):
+            try:
+                yield filepath, call()
+            except KeyError as error:
+                print(os.path.basename(filepath), error)
+                raise
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+
+def read_volume_file(filepath, sheetname, skip_rows_until, engine=ENGINE):
     """Open the Excel Volume data file given by the path and read the
     sheet with the given name, or the first sheet. Return a list
     of records, where a record is a dictionary with keys from the
     header row in the sheet.
     """
-    wb = openpyxl.load_workbook(filename=filepath)
-    ws = wb.get_sheet_by_name(sheetname)
-
-    # Awful kludge to avoid weird behaviour when reading
-    # all rows from a sheet in one file after another...
-    # Get chunks of rows until the first cell has no value.
-    rows = []
-    while True:
-        for row in ws.iter_rows(min_row=len(rows)+1, max_row=len(rows)+100):
-            # Yet another kludge to handle special case where a field
-            # supposed to contain an email address instead contains
-            # a formula that computes the email address from the name
-            # and a given domain name. I am impressed, kind of...
-            # This relies on the formula getting the first name and last
-            # name from the two preceding columns, and having the '@'
-            # before the domain name.
-            values = []
-            for pos, cell in enumerate(row):
-                value = cell.value
-                if isinstance(value, str) and value.startswith("="):
-                    value = row[pos-2].value 
-                    value += "." + row[pos-1].value
-                    value += cell.value[cell.value.index("@"):].rstrip('"')
-                    value = to_ascii(value)
-                    value = value.replace(" ", "-")
-                values.append(value)
-            rows.append(values)
-        if not rows[-1] or rows[-1][0] is None: break
-    # Remove empty rows at the end of the list.
-    while rows[-1][0] is None:
-        rows.pop()
-
-    wb.close()
-
+    return read_volume_sheets(filepath, [sheetname], skip_rows_until,
+                              engine)[sheetname]
+
+def read_volume_sheets(filepath, sheetnames, skip_rows_until, engine=ENGINE):
+    """Open the Excel Volume data file given by the path once, and read
+    all the sheets with the given names. Return a dictionary with
+    the sheet name as key and the list of records as value.
+    A sheet is read only up to the end of its data, and at most
+    MAX_COLUMNS columns, whatever its declared extent; see 'check_extent'.
+    Data found after the end of the data is logged, but not read.
+    """
+    wb = open_workbook(filepath, engine)
+    try:
+        result = {}
+        for sheetname in sheetnames:
+            rows = wb.iter_rows(sheetname, max_col=MAX_COLUMNS)
+            records, last, stray = scan_volume_extent(rows, skip_rows_until)
+            filename = os.path.basename(filepath)
+            if stray:
+                print(f"{filename} '{sheetname}': data in row {stray} after"
+                      f" the empty unit name in row {last+1}; not read")
+            check_extent(filename, sheetname, wb.get_dimension(sheetname), last)
+            result[sheetname] = records
+        return result
+    finally:
+        wb.close()
+
+def read_volume_sheet(ws, skip_rows_until):
+    """Read the records from the given sheet of an open Volume data file.
+    Return a list of records, where a record is a dictionary with keys
+    from the header row in the sheet.
+    """
+    return scan_volume_rows(ws.iter_rows(values_only=True), skip_rows_until)
+
+def open_workbook(filepath, engine=ENGINE, read_only=False):
+    """Open the Excel file given by the path using the given engine.
+    The returned object has the method 'iter_rows(sheetname, max_col)'
+    which yields the rows of the sheet as tuples of values,
+    'get_dimension(sheetname)' which returns the declared extent of the
+    sheet as a tuple (rows, columns), and 'close()'.
+    """
+    if engine == "openpyxl":
+        return OpenpyxlWorkbook(filepath, read_only=read_only)
+    elif engine == "xlsx":
+        return xlsx_reader.Workbook(filepath)
+    else:
+        raise ValueError(f"unknown engine '{engine}'")
+
+class OpenpyxlWorkbook:
+    "An Excel file opened by openpyxl, with the interface of the engines."
+
+    def __init__(self, filepath, read_only=False):
+        self.wb = openpyxl.load_workbook(filename=filepath, read_only=read_only)
+
+    def get_sheet(self, sheetname=None):
+        "Get the sheet with the given name, or the active sheet."
+        if sheetname is None:
+            return self.wb.active
+        else:
+            return self.wb[sheetname]
+
+    def get_dimension(self, sheetname=None):
+        """Get the extent of the sheet as a tuple (rows, columns).
+        In read-only mode, this is the extent declared in the file.
+        """
+        ws = self.get_sheet(sheetname)
+        return (ws.max_row, ws.max_column)
+
+    def iter_rows(self, sheetname=None, max_col=None):
+        """Yield the rows of the sheet with the given name, or of the active
+        sheet, as tuples of values. If 'max_col' is given, no more columns
+        than that are read.
+        """
+        ws = self.get_sheet(sheetname)
+        # Else openpyxl pads the rows up to 'max_col'.
+        if max_col and ws.max_column:
+            max_col = min(max_col, ws.max_column)
+        return ws.iter_rows(max_col=max_col, values_only=True)
+
+    def close(self):
+        self.wb.close()
+
+def scan_volume_rows(rows, skip_rows_until):
+    """Scan the rows (tuples of values) of a Volume data sheet once.
+    Skip rows until the header row, then read the data rows until
+    the first row having no value in the first (unit name) column.
+    Return a list of records, where a record is a dictionary with keys
+    from the header row in the sheet.
+    """
+    return scan_volume_extent(rows, skip_rows_until)[0]
+
+def scan_volume_extent(rows, skip_rows_until):
+    """Scan the rows of a Volume data sheet once; see 'scan_volume_rows'.
+    The rows must start at the first row of the sheet. After the data,
+    at most PHANTOM_ROWS more rows are looked at for any stray value.
+    Return a tuple (records, number of the last row of data, number of
+    the first row having a stray value, or None).
+    """
+    rows = enumerate(rows, 1)
     # Find the header row.
-    for first, row in enumerate(rows):
-        if row[0] and skip_rows_until in row[0]: break
-    headers = [c.strip() for c in rows[first] if c is not None]
-
-    # Find the key for the facility name. Groan! This is just terrible...
-    # The reason is that the header "1. Name of reporting unit..."
-    # sometimes has one white-space after "1.", sometimes two.
-    for key in rows[first]:
-        if "Name of reporting unit" in key: break
+    for last, row in rows:
+        if row and isinstance(row[0], str) and skip_rows_until in row[0]:
+            break
     else:
         raise KeyError("Sorry, could not find the facility name column.")
+    headers = [c.strip() for c in row if c is not None]
+
+    # The key for the facility name. Groan! This is just terrible...
+    # The header "1. Name of reporting unit..." sometimes has
+    # one white-space after "1.", sometimes two.
+    key = headers[0]
 
-    result = [dict(zip(headers, row)) for row in rows[first+1:]]
+    result = []
+    for rownum, row in rows:
+        if not row or row[0] is None: break
+        last = rownum
+        # Yet another kludge to handle special case where a field
+        # supposed to contain an email address instead contains
+        # a formula that computes the email address from the name
+        # and a given domain name. I am impressed, kind of...
+        # This relies on the formula getting the first name and last
+        # name from the two preceding columns, and having the '@'
+        # before the domain name.
+        values = list(row)
+        # The row may be shorter than the header, if the sheet does not
+        # declare its extent; see 'xlsx_reader.Workbook.iter_rows'.
+        if len(values) < len(headers):
+            values.extend([None] * (len(headers) - len(values)))
+        for pos, value in enumerate(row):
+            if isinstance(value, str) and value.startswith("="):
+                value = row[pos-2] + "." + row[pos-1]
+                value += row[pos][row[pos].index("@"):].rstrip('"')
+                value = to_ascii(value)
+                values[pos] = value.replace(" ", "-")
+        result.append(dict(zip(headers, values)))
 
     # Modify the key for the unit name to contain only single white-space.
     proper_key = " ".join(key.split())
@@ -207,8 +416,124 @@ def read_volume_file(filepath, sheetname, skip_rows_until):
         for record in result:
             record[proper_key] = record.pop(key)
 
+    # Data after the first row without a unit name is not read, but
+    # it may be a mistake in the file, e.g. a row left empty by error.
+    stray = None
+    for rownum, row in itertools.islice(rows, PHANTOM_ROWS):
+        if any([value is not None for value in row]):
+            stray = rownum
+            break
+
+    return result, last, stray
+
+def check_extent(filename, sheetname, dimension, last):
+    """Log the extent declared for the sheet, if much larger than its data,
+    which ends at the given row; the rest of the sheet is not read.
+    The dimension is a tuple (rows, columns); None if not declared.
+    Return True if logged.
+    """
+    rows, columns = dimension
+    if (rows or 0) - last > PHANTOM_ROWS or (columns or 0) > MAX_COLUMNS:
+        print(f"{filename} '{sheetname}': declared extent {rows} rows"
+              f" x {columns} columns, data ends at row {last};"
+              " skipped the rest")
+        return True
+    return False
+
+def to_ascii(value):
+    "Convert any non-ASCII character to its closest ASCII equivalent."
+    if value is None: return ''
+    value = unicodedata.normalize('NFKD', str(value))
+    return u''.join([c for c in value if not unicodedata.combining(c)])
+
+@functools.lru_cache(maxsize=None)
+def file_digest(filepath, size, mtime):
+    """Return the SHA-256 hex digest of the contents of the file.
+    The size and modification time are part of the arguments only
+    so that a modified file is read again.
+    """
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as infile:
+        for chunk in iter(lambda: infile.read(1024*1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def file_fingerprint(filepath):
+    """Return the fingerprint of the file: a tuple of its size,
+    modification time in nanoseconds, and SHA-256 hex digest.
+    """
+    stat = os.stat(filepath)
+    digest = file_digest(os.path.abspath(filepath),
+                         stat.st_size, stat.st_mtime_ns)
+    return (stat.st_size, stat.st_mtime_ns, digest)
+
+def cache_key(filepath, name):
+    """Return the cache key for the named part of the given file.
+    It is based only on the contents of the file, and on the version
+    of the readers, so that identical files (e.g. for different years)
+    share the same cache entry.
+    """
+    size, mtime, digest = file_fingerprint(filepath)
+    key = f"{digest} {READER_VERSION} {name}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+def cache_load(filepath, name):
+    """Return the records for the named part of the given file
+    from the cache. Return None if not in the cache.
+    """
+    cachefilepath = os.path.join(CACHEDIRPATH, cache_key(filepath, name))
+    try:
+        with open(cachefilepath, "rb") as infile:
+            result = pickle.loads(zlib.decompress(infile.read()))
+    except (OSError, EOFError, zlib.error, pickle.UnpicklingError):
+        return None
+    # Mark the cache file as recently used, unless already evicted by
+    # another process; the records read are still valid.
+    try:
+        os.utime(cachefilepath)
+    except FileNotFoundError:
+        pass
     return result
 
+def cache_store(filepath, name, records):
+    """Store the records for the named part of the given file in the cache.
+    Then remove the least recently used cache files, if the total size
+    of the cache exceeds the max size.
+    """
+    # Only readable by the current user.
+    os.makedirs(CACHEDIRPATH, mode=0o700, exist_ok=True)
+    data = zlib.compress(pickle.dumps(records, pickle.HIGHEST_PROTOCOL), 1)
+    # Write to a temporary file first, to never leave a partial cache file.
+    fd, tmpfilepath = tempfile.mkstemp(dir=CACHEDIRPATH, suffix=".tmp")
+    with os.fdopen(fd, "wb") as outfile:
+        outfile.write(data)
+    os.replace(tmpfilepath,
+               os.path.join(CACHEDIRPATH, cache_key(filepath, name)))
+    cache_evict()
+
+def cache_evict(max_size=CACHE_MAX_SIZE, dirpath=CACHEDIRPATH):
+    """Remove the least recently used cache files until within the max size.
+    Several processes (see 'batch.py') may use the cache at the same time.
+    """
+    entries = []
+    for entry in os.scandir(dirpath):
+        if entry.name.endswith(".tmp"): continue
+        # The file may have been removed by another process meanwhile.
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+    entries.sort()
+    total = sum([e[1] for e in entries])
+    for mtime, size, path in entries:
+        if total <= max_size: break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
 
 if __name__ == "__main__":
     units = sorted(PLATFORM_LOOKUP.keys(), key=lambda k: k.lower())
@@ -0,0 +1,255 @@
+"""Merge the Volume Data files for fellows reporting.
+
+The same code is used for the SciLifeLab Fellows and the DDLS Fellows;
+see 'merge_scilifelab_fellows.py' and 'merge_ddls_fellows.py'.
+Each sheet to merge is declared by a spec, containing:
+
+- name: The name of the merged data, used in the output file name.
+- sheetname: The name of the sheet in the volume data files.
+- header: The value in the first column of the header row of the data.
+- cols: The number of columns of the data.
+- date_cols: The columns containing dates, after moving the name and
+  email columns first; normalized to ISO dates, see 'dates.py'.
+- overrides: The headers to replace, for cells containing macros,
+  which are not properly read; lookup from column to header.
+- columns: The column layout of the output file; see 'output.py'.
+
+The last two columns of each sheet, the name and email of the fellow,
+are moved first. Each volume data file is opened once for all sheets.
+If a number of worker processes is given, and there are enough files,
+the files are read in a pool of processes, and the output files are then
+written concurrently in the same pool; by default all is done serially.
+
+The sheets are read row by row, and the rest of a sheet is skipped after
+a run of rows having an empty first cell; some sheets have formatted but
+empty rows all the way down to the last row allowed in Excel. Such a
+sheet is logged, with its declared extent and the last row of data.
+"""
+
+import argparse
+import concurrent.futures
+import glob
+import os.path
+
+import openpyxl
+
+import columnar
+import dates
+import facility_data
+import output
+
+### The sheets merged from the fellows volume data files.
+SPECS = [
+    dict(name="Teaching",
+         sheetname="2. Teaching",
+         header="1. Name of activity*",
+         cols=11,
+         date_cols=(7, 8),
+         overrides={3: "2. Level of education*",
+                    4: "3. Type of activity?*",
+                    5: "5. Did you have main responsibility of this"
+                       " educational activity?*"},
+         columns=[(0, 1, 20, "normal"),
+                  (2, 2, 20, "normal"),
+                  (3, 5, 10, "normal"),
+                  (6, 6, 5, "normal"),
+                  (7, 8, 12, "normal"),
+                  (9, 9, 5, "normal"),
+                  (10, 10, 60, "long")]),
+    dict(name="Grants",
+         sheetname="4. Grants",
+         header="1. Name of grant*",
+         cols=7,
+         date_cols=(),
+         overrides={4: "3. Type of grant*"},
+         columns=[(0, 1, 20, "normal"),
+                  (2, 2, 40, "normal"),
+                  (3, 3, 30, "normal"),
+                  (4, 4, 16, "normal"),
+                  (5, 5, 10, "normal"),
+                  (6, 6, 60, "long")]),
+    dict(name="Collaborations",
+         sheetname="5. Collaborations",
+         header="1. Name of organization*",
+         cols=8,
+         date_cols=(),
+         overrides={3: "2. Type of organization*",
+                    6: "5. Collaboration formed during 2020?*"},
+         columns=[(0, 1, 20, "normal"),
+                  (2, 2, 40, "normal"),
+                  (3, 3, 30, "normal"),
+                  (4, 4, 16, "normal"),
+                  (5, 5, 20, "normal"),
+                  (6, 6, 5, "normal"),
+                  (7, 7, 60, "long")]),
+]
+
+### The number of rows in a row with an empty first cell after which
+### the rest of a sheet is assumed to be empty.
+MAX_EMPTY_ROWS = 100
+
+### The number of volume data files below which they are read serially,
+### even if a number of worker processes is given, since starting the
+### processes would then take longer than reading the files.
+MIN_POOL_FILES = 8
+
+
+def read_file(filepath, specs=SPECS, max_empty=MAX_EMPTY_ROWS):
+    """Read the sheets of the specs from the volume data file, opening
+    it once. See 'iter_sheet' for 'max_empty'. Return a dictionary with
+    the name of the spec as key and a tuple (header, rows) as value.
+    Raise ValueError if a sheet or its header row is missing.
+    """
+    filename = os.path.basename(filepath)
+    wb = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        result = {}
+        for spec in specs:
+            try:
+                ws = wb[spec["sheetname"]]
+            except KeyError as error:
+                raise ValueError(f"{filename}: {error}")
+            result[spec["name"]] = read_sheet(ws, spec, filename, max_empty)
+        return result
+    finally:
+        wb.close()
+
+def read_sheet(ws, spec, filename=None, max_empty=MAX_EMPTY_ROWS):
+    """Read the header and the rows of the data in the sheet.
+    Return a tuple (header, rows).
+    """
+    rows = iter_sheet(ws, spec, filename, max_empty)
+    header = get_row(next(rows), spec)
+    for col, value in spec["overrides"].items():
+        header[col] = value
+    result = [get_row(row, spec) for row in rows]
+    # The dates are normalized one column at a time; see 'dates.py'.
+    for date_col in spec["date_cols"]:
+        values, report = dates.normalize([row[date_col] for row in result],
+                                         f"{filename} '{header[date_col]}'",
+                                         empty=None)
+        if report:
+            print(report)
+        for row, value in zip(result, values):
+            row[date_col] = value
+    return header, result
+
+def iter_sheet(ws, spec, filename=None, max_empty=MAX_EMPTY_ROWS):
+    """Generate the header row of the data in the sheet, and then the rows
+    of data, as they are read; the whole sheet is never in memory.
+    Rows having an empty first (key) cell are skipped. The rest of the
+    sheet is assumed to be empty after 'max_empty' such rows in a row,
+    since a sheet may have formatted but empty rows up to its very end;
+    the sheet is then logged if its declared extent is much larger.
+    Raise ValueError if the header row is not found.
+    """
+    rows = enumerate(ws.iter_rows(max_col=spec["cols"], values_only=True), 1)
+    header = None
+    empty = 0
+    # Find the header row of the data.
+    for last, row in rows:
+        if row and row[0] == spec["header"]:
+            header = row
+            break
+        empty = empty + 1 if not row or row[0] is None else 0
+        if empty >= max_empty: break
+    if header is None:
+        raise ValueError(f"{filename}: Could not find data rows for"
+                         f" '{spec['sheetname']}'")
+    yield header
+    empty = 0
+    for rownum, row in rows:
+        if row[0] is None:
+            empty += 1
+            if empty >= max_empty: break
+        else:
+            empty = 0
+            last = rownum
+            yield row
+    # The dimension of a read-only sheet is the extent declared in the file.
+    facility_data.check_extent(filename, spec["sheetname"],
+                               (ws.max_row, ws.max_column), last)
+
+def get_row(row, spec):
+    "Get the values of the columns of the data, with name and email first."
+    row = list(row[:spec["cols"]])
+    return row[-2:] + row[:-2]
+
+def write_file(filepath, header, rows, columns, data_only=False,
+               columnar_format=None):
+    """Write the merged data to the output file, without styling if
+    'data_only', and to the columnar file if a format is given.
+    """
+    sheet = output.Sheet(filepath, columns, data_only=data_only)
+    sheet.write_header(0, 0, header)
+    for pos, row in enumerate(rows, 1):
+        sheet.write_row(pos, 0, row)
+    sheet.close()
+    columnar.write(filepath, header, rows, columnar_format)
+    return filepath
+
+def merge(input_dirpath, output_dirpath, title, specs=SPECS, workers=None,
+          max_empty=MAX_EMPTY_ROWS, data_only=False, columnar_format=None):
+    """Merge the volume data files in the input directory, and write
+    one output file per spec, named by the title and the name of the spec,
+    into the output directory. The files are read, and the output files
+    written, in a pool of the given number of processes, if any and if
+    there are at least MIN_POOL_FILES files; else serially.
+    See 'iter_sheet' for 'max_empty', and 'write_file' for 'data_only'
+    and 'columnar_format'. Return the list of the output file paths.
+    """
+    filepaths = sorted(glob.glob(f"{input_dirpath}/*.xls[xm]"))
+    if len(filepaths) < MIN_POOL_FILES:
+        workers = None
+    headers = {}
+    merged = dict([(spec["name"], []) for spec in specs])
+    for filepath, sheets in facility_data.map_files(read_file, filepaths,
+                                                    specs, max_empty,
+                                                    workers=workers):
+        print(os.path.basename(filepath))
+        for name, (header, rows) in sheets.items():
+            # The header from the last file is used, as before.
+            headers[name] = header
+            merged[name].extend(rows)
+    print("Read", len(filepaths), "input Volume data files.")
+
+    # The arguments of 'write_file' for each output file.
+    outputs = []
+    for spec in specs:
+        filepath = os.path.join(output_dirpath, f"{title} {spec['name']}.xlsx")
+        outputs.append((filepath, headers.get(spec["name"]),
+                        merged[spec["name"]], spec["columns"], data_only,
+                        columnar_format))
+    if not workers:
+        return [write_file(*args) for args in outputs]
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        futures = [pool.submit(write_file, *args) for args in outputs]
+        return [future.result() for future in futures]
+
+def main(input_dirpath, output_dirpath, title, description=None):
+    "Merge the files, given the options from the command line."
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--workers", type=int,
+                        help="number of processes; default none (serial)")
+    parser.add_argument("--max-empty", type=int, default=MAX_EMPTY_ROWS,
+                        help="number of rows in a row with an empty first cell"
+                        " after which the rest of a sheet is skipped")
+    parser.add_argument("--data-only", action="store_true",
+                        help="write the merged files without any styling")
+    # Only one columnar format can be written.
+    formats = parser.add_mutually_exclusive_group()
+    formats.add_argument("--parquet", action="store_true",
+                         help="also write each merged file as a Parquet file")
+    formats.add_argument("--arrow", action="store_true",
+                         help="also write each merged file as an Arrow IPC"
+                         " file")
+    args = parser.parse_args()
+    columnar_format = columnar.get_format(args)
+    if columnar_format and columnar.pyarrow is None:
+        parser.error("the 'pyarrow' package is needed for columnar files")
+    try:
+        merge(input_dirpath, output_dirpath, title, workers=args.workers,
+              max_empty=args.max_empty, data_only=args.data_only,
+              columnar_format=columnar_format)
+    except ValueError as error:
+        parser.exit(1, f"{error}\n")
@@ -4,22 +4,31 @@ of affiliations of the users of the SciLifeLab infrastructure units.
 "Spridning av tillhörighet för SciLifeLab-enheternas användare"
 
 This code is identical to the 2021 code, except for:
+- Organized into functions, so that the rows of users may be given
+  directly from 'merge_E.py' (see 'pipeline.py') instead of being
+  read from the E file.
+- The counts are kept in a matrix (NumPy array) of facilities times
+  affiliations, from which both the plot and the CSV file are made.
+- With the option '--batch', the figure is rendered in Swedish and English,
+  in several formats and sizes, using one Kaleido process (see 'render.py').
+- The rendered figure files are cached; a figure is rendered again only
+  when its data (counts, colors, marker sizes) or layout have changed.
 """
 
+import argparse
 import csv
-import math
 import os.path
 
+import numpy
 import openpyxl
 import plotly.graph_objects as go
 
 import facility_data
+import merge_E
+import render
 import scilifelab_brand_colors
 
 
-INPUTFILENAME = os.path.join(facility_data.BASEDIRPATH,
-                             "merged_files",
-                             "E_Infrastructure Users 2022.xlsx")
 OUTPUTFILENAME = os.path.join(facility_data.BASEDIRPATH,
                               "figures",
                               "fig_5_2022")
@@ -42,12 +51,24 @@ else:
     BROWSER_HEIGHT = 850
     TITLE_Y = 0.95
 
+# The axis titles for each language of the figure.
+TITLES = {"sv": ("Infrastrukturenheter", "Användartillhörighet"),
+          "en": ("Infrastructure units", "User affiliation")}
+
+### The languages, formats and sizes (scale of the full image size) of
+### the figure files created in batch mode. The vector formats SVG and
+### PDF are created only in the full size.
+BATCH_LANGUAGES = ["sv", "en"]
+BATCH_FORMATS = ["png", "svg", "pdf"]
+BATCH_SCALES = [1.0, 0.5, 0.25]
+
 
 def get_marker_size(number):
     """Same scaling as for year 2019. Produces more overlap between circles.
     But this was considered OK, since it does reflect the reality.
+    The number may also be an array of numbers.
     """
-    return SCALE * (5 * math.sqrt(number) + 5)
+    return SCALE * (5 * numpy.sqrt(number) + 5)
 
 
 # SciLifeLab brand colors, 50% and 75% tint (saturation)
@@ -89,134 +110,259 @@ AFFILIATIONS = [
     "Other international organization",
 ]
 
-wb = openpyxl.load_workbook(INPUTFILENAME)
-ws = wb.active
-rows = list(ws)
-# Skip first row; header
-rows = rows[1:]
-records = []
-# Read off column positions manually from file.
-FACILITY_COL = 0
-PI_COL = 5
-AFFILIATION_COL = 6
-for row in rows:
-    values = [c.value for c in row]
-    affiliation = values[AFFILIATION_COL]
-    # No affiliation specified: skip (or correct in the input file).
-    if not affiliation:
-        print("No affiliation for", values[FACILITY_COL], values[PI_COL])
-        continue
-    # A trailing blank in the input XLSX pull-down menu; remove it.
-    affiliation = affiliation.strip()
-    # Some value are lower-case first character?!
-    affiliation = affiliation[0].upper() + affiliation[1:]
-    records.append(dict(facility=values[FACILITY_COL],
-                        pi=values[PI_COL],
-                        affiliation=affiliation))
-print(len(records), "records in file")
-wb.close()
-
-counts = {}
-for record in records:
-    facility = counts.setdefault(record["facility"], dict())
-    try:
-        facility[record["affiliation"]] += 1
-    except KeyError:
-        facility[record["affiliation"]] = 1
-
-# Sanity check: The hardwired facilities matches the input.
-all_facilities = counts.keys()
-if set(FACILITIES) != set(all_facilities):
-    print("Missing:", sorted(set(FACILITIES).difference(all_facilities)),
-          "\n\n",
-          "Superfluous:", sorted(set(all_facilities).difference(FACILITIES)))
-    raise ValueError("Hardwired facilities do not match input")
-
-# Sanity check: The hardwired affiliations matches the input.
-all_affiliations = set()
-for facility, affiliations in counts.items():
-    all_affiliations.update(affiliations)
-if set(AFFILIATIONS) != all_affiliations:
-    print(set(AFFILIATIONS).difference(all_affiliations),
-          "\n\n",
-          set(all_affiliations).difference(AFFILIATIONS))
-    raise ValueError("Hardwired affiliations do not match input")
-# print(sorted(all_affiliations))
-affiliation_pos = dict([(a, y) for y, a in enumerate(AFFILIATIONS)])
-
-
-data = []
-for a, affiliation in enumerate(AFFILIATIONS):
-    x = []
-    y = []
-    marker_size = []
-    marker_text = []
-    for f, facility in enumerate(FACILITIES):
-        try:
-            number = counts[facility][affiliation]
-        except KeyError:
-            pass
-        else:
-            x.append(f+1)
-            y.append(a+1)
-            marker_size.append(get_marker_size(number))
-            marker_text.append(f"{affiliation} / {facility}")
-    trace = {"mode": "markers",
-             "type": "scatter",
-             "x": x,
-             "y": y,
-             "marker": {"size": marker_size,
-                        "color": colors[a]},
-             "text": marker_text,
-             "name": affiliation,
-             "hoverinfo": "text",
-    }
-    data.append(trace)
-
-fig = go.Figure(
-    data=data,
-    layout={
-        "plot_bgcolor": "#fff",
-        "showlegend": False,
-        "xaxis": {
-            "title": {"text": "Infrastrukturenheter",
-                      "font": {"family": "Arial", "size": SCALE * 18}},
-            "range": [0, len(FACILITIES) + 1],
-            "gridcolor": "#eeeeee",
-            "tickvals": list(range(1, len(FACILITIES) + 1)),
-            "ticktext": FACILITIES,
-            "tickfont": {"family": "Arial", "size": SCALE * 16},
-            "tickangle": -40,
-        },
-        "yaxis": {
-            "title": {"text": "Användartillhörighet",
-                      "font": {"family": "Arial", "size": SCALE * 18}},
-            "gridcolor": "#eeeeee",
-            "tickvals": list(range(1, len(AFFILIATIONS) + 1)),
-            "ticktext": AFFILIATIONS,
-            "tickfont": {"family": "Arial", "size": SCALE * 16},
-            "tickangle": -40,
-            "zerolinecolor": "#6E6E6E",
-        },
-    })
-
-with open(OUTPUTFILENAME + ".csv", "w") as outfile:
-    writer = csv.writer(outfile)
-    writer.writerow(["Infrastructure Unit"] + AFFILIATIONS)
-    for facility in FACILITIES:
-        row = [facility]
-        for affiliation in AFFILIATIONS:
+# Column positions of the values in the rows of the E file,
+# from its column headers.
+FACILITY_COL = merge_E.HEADER.index("1. Name of reporting unit*")
+PI_COL = merge_E.HEADER.index("5. E-mail address of responsible PI*")
+AFFILIATION_COL = merge_E.HEADER.index(
+    "6a. Affiliation of PI: Specific university or category*")
+
+
+def read_rows(filepath=None, config=facility_data.CONFIG):
+    """Read the rows of users from the E file created by 'merge_E.py';
+    by default the one for the year of the configuration.
+    Return a list of the rows, each a tuple of values.
+    Raise ValueError if the column headers are not those of 'merge_E.py'.
+    """
+    if filepath is None:
+        filepath = config.get_merged_filepath("E")
+    wb = openpyxl.load_workbook(filepath, read_only=True)
+    rows = list(wb.active.iter_rows(values_only=True))
+    wb.close()
+    if list(rows[0][:len(merge_E.HEADER)]) != merge_E.HEADER:
+        raise ValueError(f"{filepath}: not the columns of the E file")
+    # Skip first row; header
+    return rows[1:]
+
+def get_records(rows):
+    """Get the records of facility, PI and affiliation from the rows
+    of users, as produced by 'merge_E.py' or read from the E file.
+    """
+    records = []
+    for values in rows:
+        affiliation = values[AFFILIATION_COL]
+        # No affiliation specified: skip (or correct in the input file).
+        if not affiliation:
+            print("No affiliation for", values[FACILITY_COL], values[PI_COL])
+            continue
+        # A trailing blank in the input XLSX pull-down menu; remove it.
+        affiliation = affiliation.strip()
+        # Some value are lower-case first character?!
+        affiliation = affiliation[0].upper() + affiliation[1:]
+        records.append(dict(facility=values[FACILITY_COL],
+                            pi=values[PI_COL],
+                            affiliation=affiliation))
+    print(len(records), "records in file")
+    return records
+
+class CountMatrix:
+    """The number of users for each facility and affiliation, as a dense
+    matrix with one row per facility and one column per affiliation.
+    NumPy is worth its dependency here: all users are counted in one
+    vectorized pass, and the marker sizes and the CSV file are then taken
+    from the same matrix, instead of counting again for each of them.
+    """
+
+    def __init__(self, facilities, affiliations):
+        self.facilities = list(facilities)
+        self.affiliations = list(affiliations)
+        # Lookups from name to row or column index in the matrix.
+        self.facility_index = dict([(f, i)
+                                    for i, f in enumerate(self.facilities)])
+        self.affiliation_index = dict([(a, i)
+                                       for i, a in enumerate(self.affiliations)])
+        self.matrix = numpy.zeros((len(self.facilities),
+                                   len(self.affiliations)),
+                                  dtype=numpy.int64)
+
+    def add(self, records):
+        """Add the counts for the records of facility and affiliation.
+        Return the sets of facilities and affiliations not in the matrix.
+        """
+        facility_index = self.facility_index
+        affiliation_index = self.affiliation_index
+        unknown_facilities = set()
+        unknown_affiliations = set()
+        rows = []
+        columns = []
+        for record in records:
+            try:
+                row = facility_index[record["facility"]]
+            except KeyError:
+                unknown_facilities.add(record["facility"])
+                continue
             try:
-                row.append(counts[facility][affiliation])
+                column = affiliation_index[record["affiliation"]]
             except KeyError:
-                row.append(0)
-        writer.writerow(row)
+                unknown_affiliations.add(record["affiliation"])
+                continue
+            rows.append(row)
+            columns.append(column)
+        # Count all cells in one go, using the flat index into the matrix.
+        flat = numpy.array(rows, dtype=numpy.int64) * len(self.affiliations)
+        flat += numpy.array(columns, dtype=numpy.int64)
+        self.matrix += numpy.bincount(
+            flat, minlength=self.matrix.size).reshape(self.matrix.shape)
+        return unknown_facilities, unknown_affiliations
 
+def get_counts(records, facilities=FACILITIES, affiliations=AFFILIATIONS):
+    """Count the number of users for each facility and affiliation.
+    Check that the hardwired facilities and affiliations match the input.
+    """
+    counts = CountMatrix(facilities, affiliations)
+    unknown_facilities, unknown_affiliations = counts.add(records)
+
+    # Sanity check: The hardwired facilities matches the input.
+    missing = [f for f, total in zip(counts.facilities,
+                                     counts.matrix.sum(axis=1))
+               if not total]
+    # Records of an unknown facility are not counted for any affiliation.
+    if missing or unknown_facilities:
+        print("Missing:", sorted(missing),
+              "\n\n",
+              "Superfluous:", sorted(unknown_facilities))
+        raise ValueError("Hardwired facilities do not match input")
+
+    # Sanity check: The hardwired affiliations matches the input.
+    missing = [a for a, total in zip(counts.affiliations,
+                                     counts.matrix.sum(axis=0))
+               if not total]
+    if missing or unknown_affiliations:
+        print(set(missing),
+              "\n\n",
+              unknown_affiliations)
+        raise ValueError("Hardwired affiliations do not match input")
+    return counts
+
+def get_traces(counts):
+    "Get the traces of the figure, one per affiliation, from the counts."
+    data = []
+    for a, affiliation in enumerate(counts.affiliations):
+        column = counts.matrix[:, a]
+        # Only the facilities having users of the affiliation.
+        rows = numpy.flatnonzero(column)
+        trace = {"mode": "markers",
+                 "type": "scatter",
+                 "x": (rows + 1).tolist(),
+                 "y": [a+1] * len(rows),
+                 "marker": {"size": get_marker_size(column[rows]).tolist(),
+                            "color": colors[a]},
+                 "text": [f"{affiliation} / {counts.facilities[f]}"
+                          for f in rows],
+                 "name": affiliation,
+                 "hoverinfo": "text",
+        }
+        data.append(trace)
+    return data
+
+def get_figure(counts, language="sv"):
+    "Create the figure from the counts, with axis titles in the language."
+    facilities = counts.facilities
+    affiliations = counts.affiliations
+    xaxis_title, yaxis_title = TITLES[language]
+    return go.Figure(
+        data=get_traces(counts),
+        layout={
+            "plot_bgcolor": "#fff",
+            "showlegend": False,
+            "xaxis": {
+                "title": {"text": xaxis_title,
+                          "font": {"family": "Arial", "size": SCALE * 18}},
+                "range": [0, len(facilities) + 1],
+                "gridcolor": "#eeeeee",
+                "tickvals": list(range(1, len(facilities) + 1)),
+                "ticktext": facilities,
+                "tickfont": {"family": "Arial", "size": SCALE * 16},
+                "tickangle": -40,
+            },
+            "yaxis": {
+                "title": {"text": yaxis_title,
+                          "font": {"family": "Arial", "size": SCALE * 18}},
+                "gridcolor": "#eeeeee",
+                "tickvals": list(range(1, len(affiliations) + 1)),
+                "ticktext": affiliations,
+                "tickfont": {"family": "Arial", "size": SCALE * 16},
+                "tickangle": -40,
+                "zerolinecolor": "#6E6E6E",
+            },
+        })
+
+def write_csv(counts, filepath):
+    "Write the counts for each facility and affiliation to a CSV file."
+    with open(filepath, "w") as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(["Infrastructure Unit"] + counts.affiliations)
+        for facility, row in zip(counts.facilities, counts.matrix.tolist()):
+            writer.writerow([facility] + row)
+
+def get_image_jobs(counts, outputfilename=OUTPUTFILENAME):
+    """Get the jobs for rendering the figure files in batch mode;
+    one for each language, format and size. Return a list of dictionaries
+    with the arguments for 'render.Renderer.render'.
+    """
+    result = []
+    for language in BATCH_LANGUAGES:
+        fig = get_figure(counts, language)
+        filename = outputfilename
+        if language != "sv":
+            filename += "_english"
+        for format in BATCH_FORMATS:
+            for scale in BATCH_SCALES:
+                if scale == 1.0:
+                    filepath = f"{filename}.{format}"
+                elif format == "png":
+                    filepath = (f"{filename}_{round(scale * IMAGE_WIDTH)}"
+                                f"x{round(scale * IMAGE_HEIGHT)}.{format}")
+                else:
+                    continue
+                result.append(dict(figure=fig,
+                                   filepath=filepath,
+                                   format=format,
+                                   width=IMAGE_WIDTH,
+                                   height=IMAGE_HEIGHT,
+                                   scale=scale))
+    return result
+
+def make_fig5(rows=None, outputfilename=OUTPUTFILENAME, renderer=None,
+              use_cache=True, config=facility_data.CONFIG):
+    """Create the figure 5 and the CSV file of counts from the rows
+    of users, for the units of the configuration. If the rows are not
+    given, read them from the E file for the year of the configuration.
+    The rows may be given directly from 'merge_E.py', avoiding
+    writing and reading the E file.
+    If a renderer is given, create all the figure files of the batch.
+    The figure files are taken from the cache when possible,
+    if 'use_cache'; a given renderer has its own setting.
+    """
+    if rows is None:
+        rows = read_rows(config=config)
+    counts = get_counts(get_records(rows), sorted(config.platform_lookup))
+    write_csv(counts, outputfilename + ".csv")
+    if renderer is not None:
+        renderer.render_batch(get_image_jobs(counts, outputfilename))
+        return
+    fig = get_figure(counts)
+    if IMAGE:
+        with render.Renderer(use_cache) as renderer:
+            renderer.render(fig,
+                            outputfilename + ".png",
+                            width=IMAGE_WIDTH,
+                            height=IMAGE_HEIGHT)
+    else:
+        fig.show()
 
-if IMAGE:
-    fig.write_image(OUTPUTFILENAME + ".png",
-                    width=IMAGE_WIDTH,
-                    height=IMAGE_HEIGHT)
-else:
-    fig.show()
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--batch", action="store_true",
+                        help="create the figure in all languages, formats"
+                        " and sizes, and show the time for each file")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="do not use the cache of rendered figure files")
+    args = parser.parse_args()
+    if args.batch:
+        with render.Renderer(not args.no_cache) as renderer:
+            make_fig5(renderer=renderer)
+        renderer.print()
+    else:
+        make_fig5(use_cache=not args.no_cache)
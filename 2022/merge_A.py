@@ -7,129 +7,52 @@ This code is identical to the 2021 code.
 
 import os.path
 
-import xlsxwriter
-
+import columnar
 import facility_data
+import output
 
-### Path to directory containing the downloaded aggregate files.
-DIRPATH = os.path.join(facility_data.BASEDIRPATH, "merged_files")
+### Path to directory containing the merged files.
+DIRPATH = facility_data.CONFIG.mergeddirpath
 
 ### Standard full file name for the A file.
-FILENAME = "A_Infrastructure Single Data Reported 2022.xlsx"
+FILENAME = facility_data.CONFIG.filenames["A"]
 
 # List of single-valued field identifiers to collect from the aggregate file.
-# Cut-and-paste from file 'Data files for KTH and Infra Reports.xlsx'.
-FIELD_IDENTIFIERS = """personnel_count
-personnel_count_male
-personnel_count_phd
-personnel_count_phd_male
-fte
-fte_scilifelab
-eln_usage
-resource_academic_national
-resource_academic_international
-resource_internal
-resource_industry
-resource_healthcare
-resource_other
-total_user_fees
-user_fee_models
-user_fees
-user_fees_academic_sweden
-user_fees_academic_international
-user_fees_industry
-user_fees_healthcare
-user_fees_other
-cost_reagents
-cost_instrument
-cost_salaries
-cost_rents
-cost_other
-scilifelab_instrument_funding
-number_projects
-number_projects_covid19
-fte_covid19
-impact_covid19
-user_feedback
-innovation_utilization
-technology_development
-scientific_achievements""".split("\n")
+# Given in the configuration for the year; see 'year_config.py'.
+FIELD_IDENTIFIERS = facility_data.CONFIG.field_identifiers
 
 # The column headers must match the order of the field identifiers above,
 # except for the two first.
-COLUMN_HEADERS = ["Facility",
-                  "Platform",
-                  "Personnel count",
-                  "Personnel count male",
-                  "Personnel count Phd",
-                  "Personnel count Phd male",
-                  "FTE",
-                  "FTE Scilifelab",
-                  "ELN usage",
-                  "Resource academic national",
-                  "Resource academic international",
-                  "Resource internal",
-                  "Resource industry",
-                  "Resource healthcare",
-                  "Resource other",
-                  "Total user fees",
-                  "User fee models",
-                  "User fees",
-                  "User fees academic Sweden",
-                  "User fees academic international",
-                  "User fees industry",
-                  "User fees healthcare",
-                  "User fees other",
-                  "Cost reagents",
-                  "Cost instrument",
-                  "Cost salaries",
-                  "Cost rents",
-                  "Cost other",
-                  "Instrument funding",
-                  "# Projects",
-                  "# Covid-19 projects",
-                  "# Covid-19 FTE resources",
-                  "Impact Covid-19",
-                  "User feedback",
-                  "Innovation utilization",
-                  "Technology development",
-                  "Scientific achievements"]
+COLUMN_HEADERS = facility_data.CONFIG.column_headers
 
 
-def create_A(filepath):
+def create_A(filepath, report_data=None, config=facility_data.CONFIG,
+             data_only=False, columnar_format=None):
     """Create the A file, containing single-valued fields from the
-    infrastructure facility reports.
+    infrastructure facility reports, for the year of the configuration.
+    If the report data is not given, read it.
+    The file is written without styling if 'data_only', and also as
+    a columnar file if a 'columnar_format' is given.
     """
-    wb = xlsxwriter.Workbook(filepath)
-    head_text_format = wb.add_format({'bold':True,
-                                      'text_wrap':True,
-                                      'bg_color':'#9ECA7F',
-                                      'font_size':15, 
-                                      'align':'center',
-                                      'border':1})
-    normal_text_format = wb.add_format({'font_size':14, 
-                                        'align':'left', 
-                                        'valign':'vcenter'})
-    long_text_format = wb.add_format({'text_wrap':True, 
-                                      'font_size':14,
-                                      'align':'left',
-                                      'valign':'vcenter'})
-
-    ws = wb.add_worksheet()
-    ws.freeze_panes(1, 2)
-    ws.set_row(0, None, head_text_format)
-    ws.set_column(0, 1, 40, normal_text_format)
-    ws.set_column(2, 29, 20, normal_text_format)
-    ws.set_column(33, 35, 100, long_text_format)
-
-    ws.write_row(0, 0, COLUMN_HEADERS)
-    for rownum, report in enumerate(facility_data.get_report_data()):
-        facility = report["facility"]
-        platform = facility_data.PLATFORM_LOOKUP[facility]
+    if report_data is None:
+        report_data = facility_data.get_report_data(
+            config.get_aggregate_filepath())
+    first, last = config.long_text_columns
+    sheet = output.Sheet(filepath, [(0, 1, 40, "normal"),
+                                    (2, 29, 20, "normal"),
+                                    (first, last, 100, "long")],
+                         data_only=data_only)
+    sheet.write_header(0, 0, config.column_headers)
+    rows = []
+    for rownum, report in enumerate(report_data):
+        facility, platform = config.lookup_unit(report["facility"])
         rowdata = [facility, platform]
-        rowdata.extend([report.get(fid, "") for fid in FIELD_IDENTIFIERS])
-        ws.write_row(rownum+1, 0, rowdata)
-    wb.close()
+        rowdata.extend([report.get(fid, "") for fid in config.field_identifiers])
+        sheet.write_row(rownum+1, 0, rowdata)
+        rows.append(rowdata)
+    sheet.close()
+    columnar.write(filepath, config.column_headers, rows,
+                   columnar_format)
 
     
 if __name__ == "__main__":
@@ -4,111 +4,124 @@ Create the file 'B_Infrastructure FD and HF 2022.xlsx'
 
 This code is identical to the 2021 code, except for:
 - Removing None from list of emails.
+- Grouping the director and head data by facility once, and getting
+  all fields for the persons in one traversal.
 """
 
 import os.path
 
-import xlsxwriter
-
+import columnar
 import facility_data
+import output
 
-### Path to directory containing the downloaded aggregate files.
-DIRPATH = os.path.join(facility_data.BASEDIRPATH, "merged_files")
+### Path to directory containing the merged files.
+DIRPATH = facility_data.CONFIG.mergeddirpath
 
 ### Standard full file name for the B file.
-FILENAME = "B_Infrastructure FD and HF 2022.xlsx"
+FILENAME = facility_data.CONFIG.filenames["B"]
 
+# The fields for a person, in the order of the columns for each kind.
+# Given in the configuration for the year; see 'year_config.py'.
+PERSON_FIELDS = facility_data.CONFIG.person_fields
 
-def merge_B(filepath):
-    """Create the B file, containing fields for the Facility director
-    and Head of Facility, collected from the table fields in the
-    infrastructure facility reports.
-    """
-    director_data = facility_data.get_facility_director_data()
-    head_data = facility_data.get_facility_head_data()
+# The column header for each person field.
+PERSON_HEADERS = {"First name": "First Name",
+                  "Last name": "Last Name",
+                  "Email address": "Email",
+                  "Affiliation (University)": "Affliation",
+                  "Percent salary": "Percent salary"}
 
-    # Reformat data into one row per facility
-    report_data = []
-    for facility, platform in facility_data.PLATFORM_LOOKUP.items():
-        rowdata = [facility, platform]
 
+def get_rows(director_data, head_data, units=facility_data.UNITS,
+             fields=PERSON_FIELDS):
+    """Reformat the director and head data into one row per facility
+    of the UnitResolver. The data is grouped by facility once, instead
+    of searching all records for each facility.
+    """
+    directors = facility_data.group_units(director_data, units)
+    heads = facility_data.group_units(head_data, units)
+    result = []
+    for facility, platform in units.platform_lookup.items():
+        rowdata = [facility, platform]
         # Facility director data first.
-        first_names = [r["facility_director: First name"]
-                       for r in director_data if r["facility"] == facility]
-        rowdata.append("\n".join(first_names))
-        last_names = [r["facility_director: Last name"]
-                      for r in director_data if r["facility"] == facility]
-        rowdata.append("\n".join(last_names))
-        emails = [r["facility_director: Email address"]
-                  for r in director_data if r["facility"] == facility]
-        rowdata.append("\n".join(emails))
-        affiliations = [r["facility_director: Affiliation (University)"]
-                        for r in director_data if r["facility"] == facility]
-        rowdata.append("\n".join(affiliations))
-        salarys = [str(r["facility_director: Percent salary"])
-                        for r in director_data if r["facility"] == facility]
-        rowdata.append("\n".join(salarys))
-
+        rowdata.extend(get_person_columns(directors.get(facility, []),
+                                          "facility_director",
+                                          fields))
         # Facility head data second.
-        first_names = [r["facility_head: First name"]
-                       for r in head_data if r["facility"] == facility]
-        rowdata.append("\n".join(first_names))
-        last_names = [r["facility_head: Last name"]
-                      for r in head_data if r["facility"] == facility]
-        rowdata.append("\n".join(last_names))
-        emails = [r["facility_head: Email address"]
-                  for r in head_data if r["facility"] == facility]
-        emails = [e for e in emails if e is not None]
-        rowdata.append("\n".join(emails))
-        affiliations = [r["facility_head: Affiliation (University)"]
-                        for r in head_data if r["facility"] == facility]
-        rowdata.append("\n".join(affiliations))
-        salarys = [str(r["facility_head: Percent salary"])
-                        for r in head_data if r["facility"] == facility]
-        rowdata.append("\n".join(salarys))
-
-        report_data.append(rowdata)
-
-    wb = xlsxwriter.Workbook(filepath)
-    head_text_format = wb.add_format({'bold':True,
-                                      'text_wrap':True,
-                                      'bg_color':'#9ECA7F',
-                                      'font_size':15, 
-                                      'align':'center',
-                                      'border':1})
-    normal_text_format = wb.add_format({'font_size':14, 
-                                        'align':'left', 
-                                        'valign':'vcenter'})
-    long_text_format = wb.add_format({'text_wrap':True, 
-                                      'font_size':14,
-                                      'align':'left',
-                                      'valign':'vcenter'})
-
-    ws = wb.add_worksheet()
-    ws.freeze_panes(2, 2)
-    ws.set_row(0, None, head_text_format)
-    ws.set_row(1, None, head_text_format)
-    ws.merge_range(0, 0, 1, 0, "Facility")
-    ws.merge_range(0, 1, 1, 1, "Platform")
-    ws.merge_range(0, 2, 0, 6, "Facility director")
-    ws.merge_range(0, 7, 0, 11, "Facility heads")
-    ws.write_row(1, 2, ["First Name", "Last Name", "Email", "Affliation",
-                        "Percent salary"])
-    ws.write_row(1, 7, ["First Name", "Last Name", "Email", "Affliation",
-                        "Percent salary"])
-
-    ws.set_column(0, 1, 40, long_text_format)
-    ws.set_column(2, 3, 20, long_text_format)
-    ws.set_column(4, 4, 40, long_text_format)
-    ws.set_column(5, 5, 20, long_text_format)
-    ws.set_column(7, 8, 20, long_text_format)
-    ws.set_column(9, 9, 40, long_text_format)
-    ws.set_column(10, 10, 20, long_text_format)
+        rowdata.extend(get_person_columns(heads.get(facility, []),
+                                          "facility_head",
+                                          fields))
+        result.append(rowdata)
+    return result
+
+def get_person_columns(records, prefix, fields=PERSON_FIELDS):
+    """Get the values of all person fields from the records in one traversal.
+    Return a list of the values for each field joined by newlines.
+    Missing email addresses are skipped.
+    """
+    keys = [f"{prefix}: {field}" for field in fields]
+    columns = [[] for key in keys]
+    for record in records:
+        for column, key in zip(columns, keys):
+            column.append(record[key])
+    result = []
+    for field, values in zip(fields, columns):
+        if field == "Email address":
+            values = [v for v in values if v is not None]
+        elif field == "Percent salary":
+            values = [str(v) for v in values]
+        result.append("\n".join(values))
+    return result
+
+def merge_B(filepath, director_data=None, head_data=None,
+            config=facility_data.CONFIG, data_only=False,
+            columnar_format=None):
+    """Create the B file, containing fields for the Facility director
+    and Head of Facility, collected from the table fields in the
+    infrastructure facility reports, for the year of the configuration.
+    If the director or head data is not given, read it.
+    The file is written without styling if 'data_only', and also as
+    a columnar file if a 'columnar_format' is given.
+    """
+    if director_data is None:
+        director_data = facility_data.get_facility_director_data(
+            config.get_aggregate_filepath("facility_director"))
+    if head_data is None:
+        head_data = facility_data.get_facility_head_data(
+            config.get_aggregate_filepath("facility_head"))
+
+    fields = config.person_fields
+    report_data = get_rows(director_data, head_data, config.units, fields)
+
+    # The columns for the director first, then for the heads.
+    groups = [("Facility director", 2), ("Facility heads", 2 + len(fields))]
+    columns = [(0, 1, 40, "long")]
+    for title, first in groups:
+        columns.extend([(first, first + 1, 20, "long"),
+                        (first + 2, first + 2, 40, "long"),
+                        (first + 3, first + 3, 20, "long")])
+    sheet = output.Sheet(filepath, columns, freeze=(2, 2),
+                         data_only=data_only)
+    sheet.set_header_row(0)
+    sheet.set_header_row(1)
+    sheet.merge_range(0, 0, 1, 0, "Facility")
+    sheet.merge_range(0, 1, 1, 1, "Platform")
+    headers = [PERSON_HEADERS[field] for field in fields]
+    for title, first in groups:
+        sheet.merge_range(0, first, 0, first + len(fields) - 1, title)
+        sheet.write_row(1, first, headers)
 
     for row, rowdata in enumerate(report_data, 2):
-        ws.write_row(row, 0, rowdata)
-
-    wb.close()
+        sheet.write_row(row, 0, rowdata)
+
+    sheet.close()
+    # The two header rows are joined for the columnar file.
+    columnar.write(filepath,
+                   ["Facility", "Platform"] +
+                   [f"Facility director: {header}" for header in headers] +
+                   [f"Facility heads: {header}" for header in headers],
+                   report_data,
+                   columnar_format)
 
     
 if __name__ == "__main__":
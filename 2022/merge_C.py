@@ -2,79 +2,77 @@
 
 Create the file 'C_Infrastructure Other Funding 2022.xlsx'
 
-This code is identical to the 2021 code.
+This code is identical to the 2021 code, except for:
+- Grouping the funding data by facility in one pass.
 """
 
 import os.path
 
-import xlsxwriter
-
+import columnar
 import facility_data
+import output
 
-### Path to directory containing the downloaded aggregate files.
-DIRPATH = os.path.join(facility_data.BASEDIRPATH, "merged_files")
+### Path to directory containing the merged files.
+DIRPATH = facility_data.CONFIG.mergeddirpath
 
 ### Standard full file name for the C file.
-FILENAME = "C_Infrastructure Other Funding 2022.xlsx"
+FILENAME = facility_data.CONFIG.filenames["C"]
 
+# The fields for each grant, in the order of the columns.
+FUNDING_FIELDS = ["additional_funding: Category of financier",
+                  "additional_funding: Name/type of financier",
+                  "additional_funding: Amount (kSEK)"]
 
-def merge_C(filepath):
-    """Create the C file, containing fields for additional funding.
-    """
-    funding_data = facility_data.get_additional_funding_data()
+# The column headers.
+HEADER = ("Facility",
+          "Platform",
+          "Category of financier",
+          "Name/type of financier",
+          "Amount (kSEK)")
 
-    # Reformat funding data
-    facility_funding = []
-    for facility, platform in facility_data.PLATFORM_LOOKUP.items():
-        grants = []
-        for record in funding_data:
-            if record["facility"] == facility:
-                grants.append(
-                    (record["additional_funding: Category of financier"],
-                     record["additional_funding: Name/type of financier"],
-                     record["additional_funding: Amount (kSEK)"])
-                )
-        facility_funding.append((facility, platform, grants))
+# The column layout: first and last column, width and style.
+COLUMNS = [(0, 3, 40, "long"),
+           (4, 4, 20, "long")]
 
-    wb = xlsxwriter.Workbook(filepath)
-    head_text_format = wb.add_format({'bold':True,
-                                      'text_wrap':True,
-                                      'bg_color':'#9ECA7F',
-                                      'font_size':15, 
-                                      'align':'center',
-                                      'border':1})
-    normal_text_format = wb.add_format({'font_size':14, 
-                                        'align':'left', 
-                                        'valign':'vcenter'})
-    long_text_format = wb.add_format({'text_wrap':True, 
-                                      'font_size':14,
-                                      'align':'left',
-                                      'valign':'vcenter'})
 
-    ws = wb.add_worksheet()
-    ws.freeze_panes(1, 2)
-    ws.set_row(0, None, head_text_format)
-    ws.set_column(0, 3, 40, long_text_format)
-    ws.set_column(4, 4, 20, long_text_format)
+def merge_C(filepath, funding_data=None, config=facility_data.CONFIG,
+            data_only=False, columnar_format=None):
+    """Create the C file, containing fields for additional funding,
+    for the year of the configuration.
+    If the additional funding data is not given, read it.
+    The file is written without styling if 'data_only', and also as
+    a columnar file if a 'columnar_format' is given.
+    """
+    if funding_data is None:
+        funding_data = facility_data.get_additional_funding_data(
+            config.get_aggregate_filepath("additional_funding"))
+
+    # Reformat funding data
+    facility_funding = facility_data.join_facilities(funding_data,
+                                                     FUNDING_FIELDS,
+                                                     config.units)
 
-    ws.write_row(0, 0, ("Facility", 
-                        "Platform",
-                        "Category of financier",
-                        "Name/type of financier",
-                        "Amount (kSEK)"))
+    sheet = output.Sheet(filepath, COLUMNS, data_only=data_only)
+    sheet.write_header(0, 0, HEADER)
     row = 1
     for facility, platform, grants in facility_funding:
         if len(grants) == 1:
-            ws.write_row(row, 0, (facility, platform) + grants[0])
+            sheet.write_row(row, 0, (facility, platform) + grants[0])
             row += 1
         elif len(grants) > 1:
-            ws.merge_range(row, 0, row + len(grants)-1, 0, facility)
-            ws.merge_range(row, 1, row + len(grants)-1, 1, platform)
+            sheet.merge_range(row, 0, row + len(grants)-1, 0, facility)
+            sheet.merge_range(row, 1, row + len(grants)-1, 1, platform)
             for grant in grants:
-                ws.write_row(row, 2, grant)
+                sheet.write_row(row, 2, grant)
                 row += 1
 
-    wb.close()
+    sheet.close()
+    # The columnar file has the unit on every row, instead of merged cells.
+    columnar.write(filepath, HEADER,
+                   [(facility, platform) + grant
+                    for facility, platform, grants in facility_funding
+                    for grant in grants],
+                   columnar_format)
 
     
 if __name__ == "__main__":
@@ -2,84 +2,81 @@
 
 Create the file 'D_Infrastructure Immaterial Property Rights 2022.xlsx'
 
-This code is identical to the 2022 code.
+This code is identical to the 2021 code, except for:
+- Grouping the IP data by facility in one pass.
 """
 
 import os.path
 
-import xlsxwriter
-
+import columnar
 import facility_data
+import output
 
-### Path to directory containing the downloaded aggregate files.
-DIRPATH = os.path.join(facility_data.BASEDIRPATH, "merged_files")
+### Path to directory containing the merged files.
+DIRPATH = facility_data.CONFIG.mergeddirpath
 
 ### Full file name for the D file.
-FILENAME = "D_Infrastructure Immaterial Property Rights 2022.xlsx"
+FILENAME = facility_data.CONFIG.filenames["D"]
 
+# The fields for each patent, in the order of the columns.
+IP_FIELDS = ["immaterial_property_rights: Patent title",
+             "immaterial_property_rights: Patent application number",
+             # 2018! Must have forgotten to update the form...
+             "immaterial_property_rights: Filed or granted during 2018?",
+             "immaterial_property_rights: Registered designs",
+             "immaterial_property_rights: Registered trademarks"]
 
-def merge_D(filepath):
-    """Create the D file, containing fields for immaterial property rights.
-    """
-    ip_data = facility_data.get_ip_rights_data()
+# The column headers.
+HEADER = ("Facility",
+          "Platform",
+          "Patent title",
+          "Patent application number",
+          "Filed or granted during 2018?",
+          "Registered designs",
+          "Registered trademarks")
 
-    # Reformat IP data
-    facility_ip = []
-    for facility, platform in facility_data.PLATFORM_LOOKUP.items():
-        patents = []
-        for record in ip_data:
-            if record["facility"] == facility:
-                patents.append(
-                    (record["immaterial_property_rights: Patent title"],
-                     record["immaterial_property_rights: Patent application number"],
-                     # 2018! Must have forgotten to update the form...
-                     record["immaterial_property_rights: Filed or granted during 2018?"],
-                     record["immaterial_property_rights: Registered designs"],
-                     record["immaterial_property_rights: Registered trademarks"])
-                )
-        facility_ip.append((facility, platform, patents))
+# The column layout: first and last column, width and style.
+COLUMNS = [(0, 2, 40, "long"),
+           (3, 6, 20, "long")]
 
-    wb = xlsxwriter.Workbook(filepath)
-    head_text_format = wb.add_format({'bold':True,
-                                      'text_wrap':True,
-                                      'bg_color':'#9ECA7F',
-                                      'font_size':15, 
-                                      'align':'center',
-                                      'border':1})
-    normal_text_format = wb.add_format({'font_size':14, 
-                                        'align':'left', 
-                                        'valign':'vcenter'})
-    long_text_format = wb.add_format({'text_wrap':True, 
-                                      'font_size':14,
-                                      'align':'left',
-                                      'valign':'vcenter'})
 
-    ws = wb.add_worksheet()
-    ws.freeze_panes(1, 2)
-    ws.set_row(0, None, head_text_format)
-    ws.set_column(0, 2, 40, long_text_format)
-    ws.set_column(3, 6, 20, long_text_format)
+def merge_D(filepath, ip_data=None, config=facility_data.CONFIG,
+            data_only=False, columnar_format=None):
+    """Create the D file, containing fields for immaterial property rights,
+    for the year of the configuration.
+    If the immaterial property rights data is not given, read it.
+    The file is written without styling if 'data_only', and also as
+    a columnar file if a 'columnar_format' is given.
+    """
+    if ip_data is None:
+        ip_data = facility_data.get_ip_rights_data(
+            config.get_aggregate_filepath("immaterial_property_rights"))
+
+    # Reformat IP data
+    facility_ip = facility_data.join_facilities(ip_data, IP_FIELDS,
+                                                config.units)
 
-    ws.write_row(0, 0, ("Facility", 
-                        "Platform",
-                        "Patent title",
-                        "Patent application number",
-                        "Filed or granted during 2018?",
-                        "Registered designs",
-                        "Registered trademarks"))
+    sheet = output.Sheet(filepath, COLUMNS, data_only=data_only)
+    sheet.write_header(0, 0, HEADER)
     row = 1
     for facility, platform, patents in facility_ip:
         if len(patents) == 1:
-            ws.write_row(row, 0, (facility, platform) + patents[0])
+            sheet.write_row(row, 0, (facility, platform) + patents[0])
             row += 1
         elif len(patents) > 1:
-            ws.merge_range(row, 0, row + len(patents)-1, 0, facility)
-            ws.merge_range(row, 1, row + len(patents)-1, 1, platform)
+            sheet.merge_range(row, 0, row + len(patents)-1, 0, facility)
+            sheet.merge_range(row, 1, row + len(patents)-1, 1, platform)
             for patent in patents:
-                ws.write_row(row, 2, patent)
+                sheet.write_row(row, 2, patent)
                 row += 1
 
-    wb.close()
+    sheet.close()
+    # The columnar file has the unit on every row, instead of merged cells.
+    columnar.write(filepath, HEADER,
+                   [(facility, platform) + patent
+                    for facility, platform, patents in facility_ip
+                    for patent in patents],
+                   columnar_format)
 
     
 if __name__ == "__main__":
@@ -2,91 +2,103 @@
 
 Create the file 'E_Infrastructure Users 2022.xlsx'
 
-This code is identical to the 2021 code.
+This code is identical to the 2021 code, except for:
+- The rows are produced by a separate function, and returned by
+  'merge_E' if asked for, so that the figure 5 can be made from them
+  directly.
 """
 
 import json
 import os.path
 
-import xlsxwriter
-
+import columnar
 import facility_data
+import output
 
-### Path to directory containing the downloaded aggregate files.
-DIRPATH = os.path.join(facility_data.BASEDIRPATH, "merged_files")
+### Path to directory containing the merged files.
+DIRPATH = facility_data.CONFIG.mergeddirpath
 
 ### Full file name for the E file.
-FILENAME = "E_Infrastructure Users 2022.xlsx"
-
-
-def merge_E(filepath):
-    """Create the E file, containing all facility users.
+FILENAME = facility_data.CONFIG.filenames["E"]
+
+# The column headers.
+HEADER = ["1. Name of reporting unit*",
+          "2. Platform",
+          "3. Your e-mail address*",
+          "4a. First name of the responsible PI*",
+          "4b. Surname of the responsible PI*",
+          "5. E-mail address of responsible PI*",
+          "6a. Affiliation of PI: Specific university or category*",
+          "6b. For non-specific universities and categories"
+               " in 5a, name the organization"]
+
+# The column layout: first and last column, width and style.
+COLUMNS = [(0, 2, 40, "normal"),
+           (3, 4, 20, "normal"),
+           (5, 7, 40, "normal")]
+
+
+def iter_rows(records, config=facility_data.CONFIG):
+    """Generate the rows of the E file from the records of the volume data
+    files, one at a time. The facility name is normalized, and the platform
+    added.
     """
-    wb = xlsxwriter.Workbook(filepath)
-
-    head_text_format = wb.add_format({'bold':True,
-                                      'text_wrap':True,
-                                      'bg_color':'#9ECA7F',
-                                      'font_size':15,
-                                      'align':'center',
-                                      'border':1})
-    normal_text_format = wb.add_format({'font_size':14,
-                                        'align':'left',
-                                        'valign':'vcenter'})
-    long_text_format = wb.add_format({'text_wrap':True,
-                                      'font_size':14,
-                                      'align':'left',
-                                      'valign':'vcenter'})
-
-    ws = wb.add_worksheet()
-    ws.freeze_panes(1, 2)
-    ws.set_row(0, None, head_text_format)
-    ws.set_column(0, 2, 40, normal_text_format)
-    ws.set_column(3, 4, 20, normal_text_format)
-    ws.set_column(5, 7, 40, normal_text_format)
-
-    ws.write_row(0, 0,
-                 ["1. Name of reporting unit*",
-                  "2. Platform",
-                  "3. Your e-mail address*",
-                  "4a. First name of the responsible PI*",
-                  "4b. Surname of the responsible PI*",
-                  "5. E-mail address of responsible PI*",
-                  "6a. Affiliation of PI: Specific university or category*",
-                  "6b. For non-specific universities and categories"
-                       " in 5a, name the organization"])
-
-    records = facility_data.get_volume_data("A. Users")
-
     # This key has been modified to contain only single white-space,
     # while the files bizarrely contain two white-space after "1."
     key = "1. Name of reporting unit* (choose from drop-down menu)"
 
     for row, record in enumerate(records, 1):
         try:
-            facility = record[key].strip()
-            try:
-                platform = facility_data.PLATFORM_LOOKUP[facility]
-            # Bizarrely, sometimes the facility name has wrong character case.
-            except KeyError:
-                facility, platform = facility_data.PLATFORM_LOOKUP_LOWER[facility.lower()]
-            rowdata = [facility,
-                       platform,
-                       record["2. Your e-mail address*"].lower(),
-                       record["3a. First name of the responsible PI*"],
-                       record["3b. Surname of the responsible PI*"],
-                       (record["4. E-mail address of responsible PI*"] or "").lower(),
-                       record["5a. Affiliation of PI: Specific university or"
-                              " category (choose from drop-down menu)*"],
-                       record["5b. For non-specific universities and categories"
-                              " in 5a, name the organization (free text)"]]
+            facility = record[key]
+            facility, platform = config.lookup_unit(facility)
+            yield [facility,
+                   platform,
+                   record["2. Your e-mail address*"].lower(),
+                   record["3a. First name of the responsible PI*"],
+                   record["3b. Surname of the responsible PI*"],
+                   (record["4. E-mail address of responsible PI*"] or "").lower(),
+                   record["5a. Affiliation of PI: Specific university or"
+                          " category (choose from drop-down menu)*"],
+                   record["5b. For non-specific universities and categories"
+                          " in 5a, name the organization (free text)"]]
         except (AttributeError, KeyError) as error:
             print(row, facility)
             print(json.dumps(record, indent=2))
             raise
-        ws.write_row(row, 0, rowdata)
 
-    wb.close()
+def get_rows(records, config=facility_data.CONFIG):
+    "Get the list of the rows of the E file from the records."
+    return list(iter_rows(records, config))
+
+def merge_E(filepath, records=None, config=facility_data.CONFIG,
+            keep_rows=False, data_only=False, columnar_format=None):
+    """Create the E file, containing all facility users.
+    If the records from the volume data files are not given, read them.
+    The rows are written to the file as they are produced, and are not
+    kept, unless 'keep_rows' is True or a columnar file is written.
+    Return the rows written to the file, if kept; else None.
+    The file is written without styling if 'data_only', and also as
+    a columnar file if a 'columnar_format' is given.
+    """
+    # Each row is flushed to disk when the next row is written.
+    sheet = output.Sheet(filepath, COLUMNS, constant_memory=True,
+                         data_only=data_only)
+    sheet.write_header(0, 0, HEADER)
+
+    if records is None:
+        records = facility_data.get_volume_data(
+            config.sheetnames["users"], config.voldirpath)
+    keep_rows = keep_rows or bool(columnar_format)
+    rows = []
+    for row, rowdata in enumerate(iter_rows(records, config), 1):
+        sheet.write_row(row, 0, rowdata)
+        if keep_rows:
+            rows.append(rowdata)
+
+    sheet.close()
+    if keep_rows:
+        columnar.write(filepath, HEADER, rows, columnar_format)
+        return rows
 
     
 if __name__ == "__main__":
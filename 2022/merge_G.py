@@ -4,102 +4,65 @@ Create the file 'G_Infrastructure Conferences Symposia Seminars 2022.xlsx'
 
 This code is identical to the 2021 code, except for:
 - Handle case of empty 'end'.
+- The dates are normalized one column at a time, reporting the values
+  coerced or invalid; see 'dates.py'.
+- The rows are produced by a separate function, so that they can
+  be stored in the warehouse.
 """
 
 import datetime
 import json
 import os.path
 
-import xlsxwriter
-
+import columnar
+import dates
 import facility_data
+import output
 
-### Path to directory containing the downloaded aggregate files.
-DIRPATH = os.path.join(facility_data.BASEDIRPATH, "merged_files")
+### Path to directory containing the merged files.
+DIRPATH = facility_data.CONFIG.mergeddirpath
 
 ### Full file name for the G file.
-FILENAME = "G_Infrastructure Conferences Symposia Seminars 2022.xlsx"
-
-
-def merge_G(filepath):
-    """Create the G file, containing all facility conferences, symposia, etc.
+FILENAME = facility_data.CONFIG.filenames["G"]
+
+# The column headers.
+HEADER = ["1. Name of reporting unit*",
+          "2. Platform",
+          "3. Your e-mail address*",
+          "4. Name of activity*",
+          "5a. Did the reporting unit organize or co-organize this activity?*",
+          "5b. If co-organized, with whom?",
+          "6. Start date*",
+          "7. End date*",
+          "8. Location (city) of this activity*",
+          "9. Comment"]
+
+# The column layout: first and last column, width and style.
+COLUMNS = [(0, 2, 40, "normal"),
+           (3, 3, 60, "long"),
+           (4, 4, 20, "normal"),
+           (5, 5, 30, "long"),
+           (6, 8, 20, "long"),
+           (9, 9, 40, "long")]
+
+
+def iter_rows(records, config=facility_data.CONFIG):
+    """Generate the rows of the G file from the records of the volume data
+    files, one at a time. The facility name is normalized, and the platform
+    added.
     """
-    wb = xlsxwriter.Workbook(filepath)
-
-    head_text_format = wb.add_format({'bold':True,
-                                      'text_wrap':True,
-                                      'bg_color':'#9ECA7F',
-                                      'font_size':15,
-                                      'align':'center',
-                                      'border':1})
-    normal_text_format = wb.add_format({'font_size':14,
-                                        'align':'left',
-                                        'valign':'vcenter'})
-    long_text_format = wb.add_format({'text_wrap':True,
-                                      'font_size':14,
-                                      'align':'left',
-                                      'valign':'vcenter'})
-
-    ws = wb.add_worksheet()
-    ws.freeze_panes(1, 2)
-    ws.set_row(0, None, head_text_format)
-    ws.set_column(0, 2, 40, normal_text_format)
-    ws.set_column(3, 3, 60, long_text_format)
-    ws.set_column(4, 4, 20, normal_text_format)
-    ws.set_column(5, 5, 30, long_text_format)
-    ws.set_column(6, 8, 20, long_text_format)
-    ws.set_column(9, 9, 40, long_text_format)
-
-    ws.write_row(0, 0,
-                 ["1. Name of reporting unit*",
-                  "2. Platform",
-                  "3. Your e-mail address*",
-                  "4. Name of activity*",
-                  "5a. Did the reporting unit organize or co-organize this activity?*",
-                  "5b. If co-organized, with whom?",
-                  "6. Start date*",
-                  "7. End date*",
-                  "8. Location (city) of this activity*",
-                  "9. Comment"])
-
-    records = facility_data.get_volume_data("C. Conf, symp, semin")
     key = "1. Name of reporting unit* (choose from drop-down menu)"
-    iso = "%Y-%m-%d"
-
-    for row, record in enumerate(records, 1):
+    # Arggh, another strangeness; most of the time 'datetime' instance,
+    # but sometimes an 'int' or a string. Normalize each column at once.
+    # The end date may be empty.
+    starts = dates.normalize_records(records, "5. Start date* (yyyy-mm-dd)",
+                                     required=True)
+    ends = dates.normalize_records(records, "6. End date* (yyyy-mm-dd)")
+
+    for row, (record, start, end) in enumerate(zip(records, starts, ends), 1):
         try:
-            facility = record[key].strip()
-            try:
-                platform = facility_data.PLATFORM_LOOKUP[facility]
-            # Bizarrely, sometimes the facility name has wrong character case.
-            except KeyError:
-                facility, platform = facility_data.PLATFORM_LOOKUP_LOWER[facility.lower()]
-            # Arggh, another strangeness; most of the time 'datetime' instance,
-            # but sometimes an 'int'. Try to handle it...
-            start = record["5. Start date* (yyyy-mm-dd)"]
-            if isinstance(start, datetime.datetime):
-                start = start.strftime(iso)
-            elif isinstance(start, int):
-                year = start // 10000
-                month = start // 100 % 100
-                day = start % 100
-                start = f"{year:4d}-{month:02d}-{day:02d}"
-            else:
-                raise ValueError("unknown start type '%s'" % type(start))
-
-            end = record["6. End date* (yyyy-mm-dd)"]
-            if isinstance(end, datetime.datetime):
-                end = end.strftime(iso)
-            elif isinstance(end, int):
-                year = end // 10000
-                month = end // 100 % 100
-                day = end % 100
-                end = f"{year:4d}-{month:02d}-{day:02d}"
-            elif end is None:
-                end = ""
-            else:
-                raise ValueError("unknown end type '%s'" % type(end))
-
+            facility = record[key]
+            facility, platform = config.lookup_unit(facility)
             rowdata = [facility,
                        platform,
                        record["2. Your e-mail address*"].lower(),
@@ -110,16 +73,48 @@ def merge_G(filepath):
                        end,
                        record["7. Location (city) of activity *"],
                        record["8. Comment"]]
-        except (ValueError, KeyError) as error:
+        except KeyError as error:
             print(row)
             for key, value in record.items():
                 if isinstance(value, datetime.datetime):
                     record[key] = str(value)
             print(json.dumps(record, indent=2))
             raise
-        ws.write_row(row, 0, rowdata)
+        yield rowdata
+
+def get_rows(records, config=facility_data.CONFIG):
+    "Get the list of the rows of the G file from the records."
+    return list(iter_rows(records, config))
 
-    wb.close()
+def merge_G(filepath, records=None, config=facility_data.CONFIG,
+            keep_rows=False, data_only=False, columnar_format=None):
+    """Create the G file, containing all facility conferences, symposia, etc.
+    If the records from the volume data files are not given, read them.
+    The rows are written to the file as they are produced, and are not
+    kept, unless 'keep_rows' is True or a columnar file is written.
+    Return the rows written to the file, if kept; else None.
+    The file is written without styling if 'data_only', and also as
+    a columnar file if a 'columnar_format' is given.
+    """
+    # Each row is flushed to disk when the next row is written.
+    sheet = output.Sheet(filepath, COLUMNS, constant_memory=True,
+                         data_only=data_only)
+    sheet.write_header(0, 0, HEADER)
+
+    if records is None:
+        records = facility_data.get_volume_data(
+            config.sheetnames["conferences"], config.voldirpath)
+    keep_rows = keep_rows or bool(columnar_format)
+    rows = []
+    for row, rowdata in enumerate(iter_rows(records, config), 1):
+        sheet.write_row(row, 0, rowdata)
+        if keep_rows:
+            rows.append(rowdata)
+
+    sheet.close()
+    if keep_rows:
+        columnar.write(filepath, HEADER, rows, columnar_format)
+        return rows
 
     
 if __name__ == "__main__":
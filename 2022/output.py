@@ -0,0 +1,106 @@
+"""Write the merged files, using the same styles for all of them.
+
+Each merged file has one worksheet, with a header row in bold on a green
+background, and columns of given widths having either normal or long,
+wrapped text. The column layout is declared once for each merged file,
+as a list of tuples (first column, last column, width, style), and the
+format for each style is added to the workbook only once, when first used.
+All merged files A-H, and the fellows files, are written by a Sheet.
+
+The merged files E-H, having one row per user, course, etc., are written
+in the XlsxWriter 'constant_memory' mode, each row as it is produced,
+so that the rows are not all kept in memory.
+
+The data-only mode skips all styling: no formats, column widths, frozen
+panes or merged cells; the values in the cells are the same. It is for
+fast intermediate files. The scripts creating merged files use it if the
+command line option '--data-only' is given, and pass it on to each Sheet.
+"""
+
+import xlsxwriter
+
+### The properties of the format for each style.
+STYLES = {
+    "head": {'bold':True,
+             'text_wrap':True,
+             'bg_color':'#9ECA7F',
+             'font_size':15,
+             'align':'center',
+             'border':1},
+    "normal": {'font_size':14,
+               'align':'left',
+               'valign':'vcenter'},
+    "long": {'text_wrap':True,
+             'font_size':14,
+             'align':'left',
+             'valign':'vcenter'},
+}
+
+
+class Sheet:
+    "A workbook with one worksheet, having the given column layout."
+
+    def __init__(self, filepath, columns, freeze=(1, 2),
+                 constant_memory=False, data_only=False):
+        """Create the workbook, and set the column layout; a list of
+        tuples (first column, last column, width, style).
+        The panes are frozen at the given row and column.
+        In 'constant_memory' mode, each row is flushed to disk when the
+        next row is written, so the rows must be written in order.
+        In 'data_only' mode, no styling at all is written.
+        """
+        self.data_only = data_only
+        options = {"constant_memory": True} if constant_memory else {}
+        self.workbook = xlsxwriter.Workbook(filepath, options)
+        self.worksheet = self.workbook.add_worksheet()
+        self.formats = {}
+        if self.data_only: return
+        self.worksheet.freeze_panes(*freeze)
+        for first, last, width, style in columns:
+            self.worksheet.set_column(first, last, width, self.get_format(style))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def get_format(self, style):
+        """Get the format for the style, adding it to the workbook if
+        not already done. None in data-only mode.
+        """
+        if self.data_only: return None
+        try:
+            return self.formats[style]
+        except KeyError:
+            format = self.workbook.add_format(STYLES[style])
+            self.formats[style] = format
+            return format
+
+    def write_header(self, row, column, headers):
+        "Write the headers in the given row, which has the head style."
+        self.set_header_row(row)
+        self.worksheet.write_row(row, column, headers)
+
+    def set_header_row(self, row):
+        "Set the head style for the given row."
+        if self.data_only: return
+        self.worksheet.set_row(row, None, self.get_format("head"))
+
+    def write_row(self, row, column, values):
+        "Write the values in the given row, starting at the column."
+        self.worksheet.write_row(row, column, values)
+
+    def merge_range(self, first_row, first_column, last_row, last_column,
+                    value):
+        """Merge the range of cells, and write the value in it.
+        In data-only mode, the value is written in the first cell only.
+        """
+        if self.data_only:
+            self.worksheet.write(first_row, first_column, value)
+        else:
+            self.worksheet.merge_range(first_row, first_column,
+                                       last_row, last_column, value)
+
+    def close(self):
+        self.workbook.close()
@@ -0,0 +1,221 @@
+"""Infrastructure Units Reports 2022.
+
+Create all the merged files A-H, and the figure 5, in one process.
+Each aggregate file is read once, and the volume data files are read once
+for all four sheets. The data is kept in memory and given to the merge
+functions. The figure 5 is made from the rows of users produced when
+creating the E file, instead of reading the E file.
+The time taken by each stage is printed.
+
+    $ python pipeline.py [--year Y] [--workers N] [--engine xlsx] [--no-cache] [--warehouse] [A B fig5 ...]
+
+Only the given merged files (and figure) are created, if any; otherwise all.
+The files for an earlier year are created from its configuration; see
+'year_config.py'. The figure 5 can be made only for the current year.
+With '--warehouse', the records of all merged files for the year are
+also stored in the warehouse database; see 'warehouse.py'.
+"""
+
+import argparse
+import time
+
+import columnar
+import facility_data
+import year_config
+import make_fig5
+import warehouse
+import merge_A
+import merge_B
+import merge_C
+import merge_D
+import merge_E
+import merge_F
+import merge_G
+import merge_H
+
+# The functions to get the data from the aggregate files.
+AGGREGATES = {
+    "report": facility_data.get_report_data,
+    "director": facility_data.get_facility_director_data,
+    "head": facility_data.get_facility_head_data,
+    "funding": facility_data.get_additional_funding_data,
+    "ip": facility_data.get_ip_rights_data,
+}
+
+# The table field of each aggregate file; None for the single-valued fields.
+AGGREGATE_TABLES = {
+    "report": None,
+    "director": "facility_director",
+    "head": "facility_head",
+    "funding": "additional_funding",
+    "ip": "immaterial_property_rights",
+}
+
+# For each merged file: the module, the merge function, and the inputs
+# it needs; either the name of an aggregate data, or of a volume data sheet
+# in the configuration for the year.
+TARGETS = {
+    "A": (merge_A, merge_A.create_A, ["report"]),
+    "B": (merge_B, merge_B.merge_B, ["director", "head"]),
+    "C": (merge_C, merge_C.merge_C, ["funding"]),
+    "D": (merge_D, merge_D.merge_D, ["ip"]),
+    "E": (merge_E, merge_E.merge_E, ["users"]),
+    "F": (merge_F, merge_F.merge_F, ["courses"]),
+    "G": (merge_G, merge_G.merge_G, ["conferences"]),
+    "H": (merge_H, merge_H.merge_H, ["collaborations"]),
+}
+
+# The figure 5, which is made from the rows of the E file.
+FIG5 = "fig5"
+
+
+class Timer:
+    "Run the stages of the pipeline, and record the time taken by each."
+
+    def __init__(self):
+        self.timings = []
+
+    def __call__(self, stage, function, *args, **kwargs):
+        "Run the function as the named stage. Return its result."
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        self.timings.append((stage, time.perf_counter() - start))
+        return result
+
+    def print(self):
+        print()
+        for stage, elapsed in self.timings:
+            print(f"{stage:30s} {elapsed:8.3f} s")
+        total = sum([t[1] for t in self.timings])
+        print(f"{'total':30s} {total:8.3f} s")
+
+
+def load_data(targets, timer, workers=None, engine=facility_data.ENGINE,
+              config=facility_data.CONFIG, use_cache=True):
+    """Read the inputs needed by the given targets. Each aggregate file
+    is read once, and the volume data files once for all sheets needed;
+    from the cache of parsed input files if 'use_cache' and possible.
+    Return a dictionary with the input name as key and the records as value.
+    """
+    inputs = []
+    for target in targets:
+        if target == FIG5: continue
+        for name in TARGETS[target][2]:
+            if name not in inputs:
+                inputs.append(name)
+    data = {}
+    for name in inputs:
+        if name in AGGREGATES:
+            filepath = config.get_aggregate_filepath(AGGREGATE_TABLES[name])
+            data[name] = timer(f"read {name}", AGGREGATES[name],
+                               filepath, engine=engine, use_cache=use_cache)
+    names = [name for name in inputs if name not in AGGREGATES]
+    if names:
+        sheets = timer("read volume data",
+                       facility_data.get_volume_sheets,
+                       [config.sheetnames[name] for name in names],
+                       dirpath=config.voldirpath,
+                       workers=workers,
+                       engine=engine,
+                       use_cache=use_cache)
+        for name in names:
+            data[name] = sheets[config.sheetnames[name]]
+    return data
+
+def run(targets=TARGETS, workers=None, engine=facility_data.ENGINE,
+        config=facility_data.CONFIG, warehouse_filepath=None,
+        use_cache=True, data_only=False, columnar_format=None):
+    """Create the merged files, and the figure 5, for the given targets,
+    for the year of the configuration. If the warehouse file path is
+    given, store the records of all merged files for the year in it.
+    The caches are used if 'use_cache'. The merged files are written
+    without styling if 'data_only', and also as columnar files if
+    a 'columnar_format' is given.
+    Return the timer containing the time for each stage.
+    """
+    if FIG5 in targets and config.year != facility_data.YEAR:
+        raise ValueError(f"figure 5 can be made only for {facility_data.YEAR}")
+    timer = Timer()
+    # The warehouse needs the inputs of all merged files.
+    data = load_data(list(TARGETS) if warehouse_filepath else targets,
+                     timer, workers=workers, engine=engine, config=config,
+                     use_cache=use_cache)
+    results = {}
+    for target in targets:
+        if target == FIG5: continue
+        module, merge, inputs = TARGETS[target]
+        kwargs = dict(config=config,
+                      data_only=data_only,
+                      columnar_format=columnar_format)
+        # The rows of the files E-H are kept for the warehouse, and the rows
+        # of users also for the figure 5; else not kept.
+        if target in warehouse.MERGED_TABLES:
+            kwargs["keep_rows"] = (bool(warehouse_filepath) or
+                                   (target == "E" and FIG5 in targets))
+        results[target] = timer(f"merge {target}",
+                                merge,
+                                config.get_merged_filepath(target),
+                                *[data[name] for name in inputs],
+                                **kwargs)
+    if FIG5 in targets:
+        # The rows of users from merge_E, if created now; else read the E file.
+        timer("make figure 5", make_fig5.make_fig5, results.get("E"),
+              use_cache=use_cache, config=config)
+    if warehouse_filepath:
+        # The rows of the files E-H created now are not produced again.
+        merged_rows = dict([(target, rows) for target, rows in results.items()
+                            if target in warehouse.MERGED_TABLES])
+        timer("store warehouse", warehouse.store, data, config=config,
+              filepath=warehouse_filepath, merged_rows=merged_rows)
+    return timer
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("targets", nargs="*",
+                        help="the merged files to create, any of"
+                        f" {' '.join(TARGETS)} {FIG5}; default all")
+    parser.add_argument("--year", type=int, default=facility_data.YEAR,
+                        choices=year_config.get_years(),
+                        help="the year of the reports")
+    parser.add_argument("--workers", type=int,
+                        default=facility_data.WORKERS,
+                        help="number of processes for the volume data files")
+    parser.add_argument("--engine", choices=["openpyxl", "xlsx"],
+                        default=facility_data.ENGINE,
+                        help="engine for reading XLSX files")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="do not use the cache of parsed input files")
+    parser.add_argument("--data-only", action="store_true",
+                        help="write the merged files without any styling")
+    # Only one columnar format can be written.
+    formats = parser.add_mutually_exclusive_group()
+    formats.add_argument("--parquet", action="store_true",
+                         help="also write each merged file as a Parquet file")
+    formats.add_argument("--arrow", action="store_true",
+                         help="also write each merged file as an Arrow IPC"
+                         " file")
+    parser.add_argument("--warehouse", action="store_true",
+                        help="store the records in the warehouse database")
+    args = parser.parse_args()
+    columnar_format = columnar.get_format(args)
+    if columnar_format and columnar.pyarrow is None:
+        parser.error("the 'pyarrow' package is needed for columnar files")
+    for target in args.targets:
+        if target not in TARGETS and target != FIG5:
+            parser.error(f"no such merged file '{target}'")
+    config = year_config.load(args.year)
+    warehouse_filepath = warehouse.WAREHOUSE_FILEPATH if args.warehouse else None
+    if not args.targets:
+        args.targets = list(TARGETS)
+        if args.year == facility_data.YEAR:
+            args.targets.append(FIG5)
+    timer = run(args.targets,
+                workers=args.workers,
+                engine=args.engine,
+                config=config,
+                warehouse_filepath=warehouse_filepath,
+                use_cache=not args.no_cache,
+                data_only=args.data_only,
+                columnar_format=columnar_format)
+    timer.print()
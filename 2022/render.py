@@ -0,0 +1,174 @@
+"""Render Plotly figures to image files, using one Kaleido process for
+all of them.
+
+Each call of 'fig.write_image' in a new process has to start Kaleido
+(a headless Chromium) first, which takes much longer than rendering
+the figure itself. The Renderer starts Kaleido once and keeps it
+running while a batch of figures is rendered, in several formats and
+sizes. The time taken to render each figure file is recorded.
+
+The rendered files are kept in a cache, with a key computed from the
+data (traces) of the figure, its layout, and the format and size. A figure
+that has been rendered before is copied from the cache, and Kaleido
+is not even started if all figures are in the cache.
+"""
+
+import hashlib
+import json
+import os
+import os.path
+import shutil
+import tempfile
+import time
+
+import plotly
+import plotly.io
+import plotly.utils
+
+import facility_data
+
+### Path to directory containing the cache of rendered figure files;
+### in the local directory of the caches of the current user.
+CACHEDIRPATH = os.path.join(facility_data.CACHEBASEDIRPATH, "figures")
+
+### Max total size of the cached figure files, in bytes. When exceeded,
+### the least recently used files are removed.
+CACHE_MAX_SIZE = 200 * 1024 * 1024
+
+
+class Renderer:
+    "A Kaleido process kept running for rendering figures to files."
+
+    def __init__(self, use_cache=True):
+        """The rendered files are taken from, and stored in, the cache
+        if 'use_cache'.
+        """
+        self.use_cache = use_cache
+        # The Kaleido scope set up by Plotly, using its own plotly.js file.
+        self.scope = plotly.io.kaleido.scope
+        if self.scope is None:
+            raise ValueError("the 'kaleido' package is not installed")
+        self.started = False
+        self.timings = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def start(self):
+        """Start the Kaleido process, by rendering a minimal figure.
+        Otherwise it is started by the first figure rendered.
+        """
+        start = time.perf_counter()
+        plotly.io.to_image({"data": [], "layout": {}}, format="png",
+                           width=100, height=100, engine="kaleido")
+        self.timings.append(("start Kaleido", time.perf_counter() - start))
+        self.started = True
+
+    def close(self):
+        """Stop the Kaleido process, if started. Kaleido has no public call
+        for this; if its internal one is missing, the process is left to
+        stop when this process exits and closes its pipes.
+        """
+        shutdown = getattr(self.scope, "_shutdown_kaleido", None)
+        if shutdown is not None:
+            shutdown()
+        self.started = False
+
+    def render(self, figure, filepath, format="png",
+               width=None, height=None, scale=1.0):
+        """Render the figure to the file in the given format, or copy it
+        from the cache if it has been rendered before.
+        The size of the image is the width and height times the scale.
+        Return the time taken in seconds.
+        """
+        start = time.perf_counter()
+        key = get_key(figure, format, width, height, scale)
+        if self.use_cache and cache_copy(key, filepath):
+            elapsed = time.perf_counter() - start
+            self.timings.append((f"{os.path.basename(filepath)} (cached)",
+                                 elapsed))
+            return elapsed
+        if not self.started:
+            self.start()
+            start = time.perf_counter()
+        # Plotly renders by the Kaleido scope, which keeps its process.
+        data = plotly.io.to_image(figure,
+                                  format=format,
+                                  width=width,
+                                  height=height,
+                                  scale=scale,
+                                  engine="kaleido")
+        with open(filepath, "wb") as outfile:
+            outfile.write(data)
+        if self.use_cache:
+            cache_store(key, data)
+        elapsed = time.perf_counter() - start
+        self.timings.append((os.path.basename(filepath), elapsed))
+        return elapsed
+
+    def render_batch(self, jobs):
+        """Render a batch of figures. Each job is a dictionary with the
+        arguments for 'render'. Return the list of the file paths.
+        """
+        result = []
+        for job in jobs:
+            self.render(**job)
+            result.append(job["filepath"])
+        return result
+
+    def print(self):
+        print()
+        for name, elapsed in self.timings:
+            print(f"{name:40s} {elapsed:8.3f} s")
+        total = sum([t[1] for t in self.timings])
+        print(f"{'total':40s} {total:8.3f} s")
+
+
+def get_key(figure, format, width, height, scale):
+    """Get the cache key for the rendered figure: the SHA-256 hex digest
+    of the data (traces) and the layout of the figure, the format and
+    the size. The data includes everything drawn, such as the colors and
+    the sizes of the markers, not only the values.
+    """
+    figure = figure.to_plotly_json()
+    digest = hashlib.sha256()
+    digest.update(json.dumps(figure["data"], sort_keys=True,
+                             cls=plotly.utils.PlotlyJSONEncoder).encode("utf-8"))
+    digest.update(json.dumps(figure["layout"], sort_keys=True,
+                             cls=plotly.utils.PlotlyJSONEncoder).encode("utf-8"))
+    # The Plotly version, since it determines the plotly.js used.
+    digest.update(f"{format} {width} {height} {scale} {plotly.__version__}"
+                  .encode("utf-8"))
+    return digest.hexdigest()
+
+def cache_copy(key, filepath):
+    """Copy the cached figure file for the key to the file path.
+    Return True if done, False if not in the cache.
+    """
+    cachefilepath = os.path.join(CACHEDIRPATH, key)
+    try:
+        shutil.copyfile(cachefilepath, filepath)
+    except FileNotFoundError:
+        return False
+    # Mark the cache file as recently used, unless already evicted by
+    # another process; the copy is still valid.
+    try:
+        os.utime(cachefilepath)
+    except FileNotFoundError:
+        pass
+    return True
+
+def cache_store(key, data):
+    """Store the rendered figure file data in the cache. Then remove the
+    least recently used files, if the total size exceeds the max size.
+    """
+    os.makedirs(CACHEDIRPATH, mode=0o700, exist_ok=True)
+    # Write to a temporary file first, to never leave a partial cache file.
+    fd, tmpfilepath = tempfile.mkstemp(dir=CACHEDIRPATH, suffix=".tmp")
+    with os.fdopen(fd, "wb") as outfile:
+        outfile.write(data)
+    os.replace(tmpfilepath, os.path.join(CACHEDIRPATH, key))
+    facility_data.cache_evict(CACHE_MAX_SIZE, CACHEDIRPATH)
@@ -0,0 +1,253 @@
+"""Infrastructure Units Reports, warehouse of all years.
+
+Store the normalized records of the merged files A-H for each year in
+one SQLite database, so that questions across the years can be answered
+by indexed queries instead of by opening the merged files of each year.
+The facility name is normalized and the platform added, as in the
+merged files. Every table has the columns 'year', 'facility' and
+'platform', which are indexed.
+
+The records for a year are stored when the merged files are created by
+'pipeline.py' or 'batch.py' with the option '--warehouse'. Storing a
+year again replaces its previous records.
+
+    $ python warehouse.py [query ...]
+
+Show the result of the given example queries; by default all.
+"""
+
+import argparse
+import os.path
+import sqlite3
+
+import facility_data
+import merge_C
+import merge_D
+import merge_E
+import merge_F
+import merge_G
+import merge_H
+
+### Path to the SQLite database file of the warehouse; in the local data
+### directory of the current user, or set by the environment variable
+### KTH_REPORT_WAREHOUSE, if given. It must not be in a shared or synced
+### directory, where concurrent copies of the file would clash.
+WAREHOUSE_FILEPATH = (os.environ.get("KTH_REPORT_WAREHOUSE") or
+                      os.path.join(os.environ.get("XDG_DATA_HOME") or
+                                   os.path.expanduser("~/.local/share"),
+                                   "kth_report",
+                                   "warehouse.sqlite3"))
+
+### Seconds to wait for another process storing its year.
+TIMEOUT = 60.0
+
+# The tables having the rows of the merged files E-H, and the module
+# creating each file. The input data has the same name as the table.
+MERGED_TABLES = {
+    "E": ("users", merge_E),
+    "F": ("courses", merge_F),
+    "G": ("conferences", merge_G),
+    "H": ("collaborations", merge_H),
+}
+
+# The columns of each table, after 'year', 'facility' and 'platform'.
+TABLES = {
+    # The single-valued fields of the A file, one row per field.
+    "single_data": ["field", "value"],
+    # The facility directors and heads of the B file.
+    "persons": ["role",
+                "first_name",
+                "last_name",
+                "email",
+                "affiliation",
+                "percent_salary"],
+    "funding": ["category", "financier", "amount"],
+    "ip_rights": ["title",
+                  "application_number",
+                  "filed_or_granted",
+                  "registered_designs",
+                  "registered_trademarks"],
+    "users": ["reporter_email",
+              "pi_first_name",
+              "pi_last_name",
+              "pi_email",
+              "affiliation",
+              "organization"],
+    "courses": ["reporter_email",
+                "name",
+                "organized",
+                "coorganizer",
+                "start_date",
+                "end_date",
+                "location",
+                "comment"],
+    "conferences": ["reporter_email",
+                    "name",
+                    "organized",
+                    "coorganizer",
+                    "start_date",
+                    "end_date",
+                    "location",
+                    "comment"],
+    "collaborations": ["reporter_email",
+                       "organization",
+                       "organization_type",
+                       "reference_person",
+                       "purpose"],
+}
+
+# Additional indexes, for the lookup of a field in the single data.
+INDEXES = {
+    "single_data": [("field", "facility", "year")],
+    "users": [("affiliation",)],
+}
+
+# The column of the persons table for each field in the B file.
+PERSON_COLUMNS = {"First name": "first_name",
+                  "Last name": "last_name",
+                  "Email address": "email",
+                  "Affiliation (University)": "affiliation",
+                  "Percent salary": "percent_salary"}
+
+# Example queries across the years.
+QUERIES = {
+    "affiliations":
+    ("Number of users per platform and affiliation, for each year.",
+     "SELECT platform, affiliation, year, COUNT(*) FROM users"
+     " GROUP BY platform, affiliation, year"
+     " ORDER BY platform, affiliation, year"),
+    "user_fees":
+    ("Total user fees (kSEK) per unit, for each year.",
+     "SELECT facility, year, value FROM single_data"
+     " WHERE field='total_user_fees' ORDER BY facility, year"),
+    "years":
+    ("Number of units, users and courses, for each year.",
+     "SELECT year, COUNT(DISTINCT facility), COUNT(*),"
+     " (SELECT COUNT(*) FROM courses WHERE courses.year=users.year)"
+     " FROM users GROUP BY year ORDER BY year"),
+}
+
+
+def connect(filepath=WAREHOUSE_FILEPATH):
+    """Connect to the warehouse database, creating its tables
+    and indexes if not done.
+    """
+    dirpath = os.path.dirname(filepath)
+    if dirpath:
+        os.makedirs(dirpath, mode=0o700, exist_ok=True)
+    cnx = sqlite3.connect(filepath, timeout=TIMEOUT)
+    with cnx:
+        for table, columns in TABLES.items():
+            cnx.execute(f"CREATE TABLE IF NOT EXISTS {table}"
+                        f" (year INTEGER NOT NULL,"
+                        f" facility TEXT NOT NULL,"
+                        f" platform TEXT,"
+                        f" {', '.join(columns)})")
+            indexes = [("facility", "year"), ("platform", "year"), ("year",)]
+            indexes.extend(INDEXES.get(table, []))
+            for index in indexes:
+                cnx.execute(f"CREATE INDEX IF NOT EXISTS"
+                            f" {table}_{'_'.join(index)}_index"
+                            f" ON {table} ({', '.join(index)})")
+    return cnx
+
+def get_rows(data, config=facility_data.CONFIG, merged_rows={}):
+    """Get the rows of each table from the input data for the year;
+    the dictionary with the input name as key and the records as value,
+    as loaded by the pipeline. The year is not included in the rows.
+    The rows of the merged files E-H are taken from 'merged_rows', a
+    dictionary with the letter of the file as key and the rows returned
+    by its merge function as value, if given; else they are produced.
+    Return a dictionary with the table name as key and the rows as value;
+    an iterator producing the rows one at a time if not given.
+    """
+    result = {}
+    rows = []
+    for report in data["report"]:
+        facility, platform = config.lookup_unit(report["facility"])
+        for fid in config.field_identifiers:
+            value = report.get(fid)
+            if value is not None:
+                rows.append((facility, platform, fid, value))
+    result["single_data"] = rows
+
+    # The persons are given the columns for the fields of the year.
+    columns = TABLES["persons"][1:]
+    rows = []
+    for role, name in [("facility_director", "director"),
+                       ("facility_head", "head")]:
+        fields = [f"{role}: {field}" for field in config.person_fields]
+        indexes = [columns.index(PERSON_COLUMNS[field])
+                   for field in config.person_fields]
+        for facility, platform, persons in facility_data.join_facilities(
+                data[name], fields, config.units):
+            for person in persons:
+                values = [None] * len(columns)
+                for index, value in zip(indexes, person):
+                    values[index] = value
+                rows.append((facility, platform, role, *values))
+    result["persons"] = rows
+
+    for table, name, fields in [("funding", "funding", merge_C.FUNDING_FIELDS),
+                                ("ip_rights", "ip", merge_D.IP_FIELDS)]:
+        result[table] = [(facility, platform, *values)
+                         for facility, platform, rows in
+                         facility_data.join_facilities(data[name], fields,
+                                                       config.units)
+                         for values in rows]
+
+    # Producing the rows again would normalize the dates again.
+    for target, (table, module) in MERGED_TABLES.items():
+        if target in merged_rows:
+            result[table] = merged_rows[target]
+        else:
+            result[table] = module.iter_rows(data[table], config)
+    return result
+
+def store(data, config=facility_data.CONFIG, filepath=WAREHOUSE_FILEPATH,
+          merged_rows={}):
+    """Store the rows of all tables for the year of the configuration,
+    replacing any previously stored for the year, in one transaction.
+    See 'get_rows' for 'merged_rows'.
+    Return a dictionary with the table name as key and the number of rows.
+    """
+    tables = get_rows(data, config, merged_rows)
+    result = {}
+    cnx = connect(filepath)
+    try:
+        with cnx:
+            for table, rows in tables.items():
+                cnx.execute(f"DELETE FROM {table} WHERE year=?", (config.year,))
+                marks = ", ".join(["?"] * (len(TABLES[table]) + 3))
+                cursor = cnx.executemany(
+                    f"INSERT INTO {table} VALUES ({marks})",
+                    ((config.year, *row) for row in rows))
+                result[table] = cursor.rowcount
+    finally:
+        cnx.close()
+    return result
+
+def query(sql, parameters=(), filepath=WAREHOUSE_FILEPATH):
+    "Return the rows from the SQL query of the warehouse."
+    cnx = connect(filepath)
+    try:
+        return cnx.execute(sql, parameters).fetchall()
+    finally:
+        cnx.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("queries", nargs="*",
+                        help=f"the example queries to show, any of"
+                        f" {' '.join(QUERIES)}; default all")
+    args = parser.parse_args()
+    for name in args.queries:
+        if name not in QUERIES:
+            parser.error(f"no such query '{name}'")
+    for name in args.queries or QUERIES:
+        title, sql = QUERIES[name]
+        print(title)
+        for row in query(sql):
+            print("  ", "\t".join([str(value) for value in row]))
+        print()
@@ -0,0 +1,335 @@
+"""Read the rows of XLSX sheets by streaming the XML directly from the file.
+
+An alternative to openpyxl for reading large files: the sheet XML and
+the shared strings XML are parsed incrementally from the zip file, and
+each row is produced as a tuple of plain values. No cell, style or
+worksheet objects are created.
+
+The values are the same as those given by openpyxl (not in data-only
+mode): strings, ints, floats, booleans, datetimes for cells having a
+date number format, and formulas as strings starting with '='.
+Some helper functions from openpyxl are used for the number formats,
+dates and shared formulas, to make sure the values are identical.
+"""
+
+import posixpath
+import xml.etree.ElementTree as ElementTree
+import zipfile
+
+from openpyxl.formula.translate import Translator
+from openpyxl.styles.numbers import (builtin_format_code,
+                                     is_date_format,
+                                     is_timedelta_format)
+from openpyxl.utils.cell import column_index_from_string
+from openpyxl.utils.datetime import (from_excel,
+                                     from_ISO8601,
+                                     CALENDAR_MAC_1904,
+                                     WINDOWS_EPOCH)
+
+PACKAGE_RELS_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+RELS_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+WORKSHEET_TYPE = RELS_NS + "/worksheet"
+OFFICE_DOCUMENT_TYPE = RELS_NS + "/officeDocument"
+
+# Size of the chunks of XML fed to the incremental parser.
+CHUNK_SIZE = 64 * 1024
+
+DIGITS = "0123456789"
+
+
+class Workbook:
+    "An XLSX file opened for streaming the rows of its sheets."
+
+    def __init__(self, filepath):
+        self.zipfile = zipfile.ZipFile(filepath)
+        self.workbook_path = self.get_office_document_path()
+        rels = self.get_rels(self.workbook_path)
+        root = ElementTree.fromstring(self.zipfile.read(self.workbook_path))
+        # The main namespace is either the transitional or strict one.
+        self.ns = root.tag[1:].split("}")[0]
+        # Lookup from sheet name to the path of the sheet XML in the zip.
+        self.sheets = {}
+        for sheet in root.iter(f"{{{self.ns}}}sheet"):
+            target, type = rels[sheet.get(f"{{{RELS_NS}}}id")]
+            if type == WORKSHEET_TYPE:
+                self.sheets[sheet.get("name")] = target
+        self.active = 0
+        for view in root.iter(f"{{{self.ns}}}workbookView"):
+            self.active = int(view.get("activeTab", 0))
+            break
+        self.epoch = WINDOWS_EPOCH
+        for properties in root.iter(f"{{{self.ns}}}workbookPr"):
+            if properties.get("date1904") in ("1", "true"):
+                self.epoch = CALENDAR_MAC_1904
+        self.shared_strings_path = None
+        self.styles_path = None
+        for target, type in rels.values():
+            if type == RELS_NS + "/sharedStrings":
+                self.shared_strings_path = target
+            elif type == RELS_NS + "/styles":
+                self.styles_path = target
+        self._shared_strings = None
+        self._date_styles = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def sheetnames(self):
+        return list(self.sheets)
+
+    def close(self):
+        self.zipfile.close()
+
+    def get_office_document_path(self):
+        "Get the path of the main workbook XML from the package relations."
+        root = ElementTree.fromstring(self.zipfile.read("_rels/.rels"))
+        for rel in root.iter(f"{{{PACKAGE_RELS_NS}}}Relationship"):
+            if rel.get("Type") == OFFICE_DOCUMENT_TYPE:
+                return rel.get("Target").lstrip("/")
+        return "xl/workbook.xml"
+
+    def get_rels(self, path):
+        """Get the relations for the XML file given by the path.
+        Return a lookup from id to tuple (path, type).
+        """
+        dirpath, filename = posixpath.split(path)
+        relspath = posixpath.join(dirpath, "_rels", filename + ".rels")
+        root = ElementTree.fromstring(self.zipfile.read(relspath))
+        result = {}
+        for rel in root.iter(f"{{{PACKAGE_RELS_NS}}}Relationship"):
+            target = rel.get("Target")
+            if target.startswith("/"):
+                target = target.lstrip("/")
+            else:
+                target = posixpath.normpath(posixpath.join(dirpath, target))
+            result[rel.get("Id")] = (target, rel.get("Type"))
+        return result
+
+    @property
+    def shared_strings(self):
+        "The list of shared strings; read when first needed."
+        if self._shared_strings is None:
+            self._shared_strings = []
+            if self.shared_strings_path:
+                si = f"{{{self.ns}}}si"
+                t = f"{{{self.ns}}}t"
+                r = f"{{{self.ns}}}r"
+                for event, element in self.iterparse(self.shared_strings_path):
+                    if element.tag != si: continue
+                    # Plain text, and rich text runs; skip phonetic runs.
+                    parts = [element.findtext(t) or ""]
+                    for run in element.iterfind(r):
+                        parts.append(run.findtext(t) or "")
+                    text = "".join(parts).replace("x005F_", "")
+                    self._shared_strings.append(text)
+                    element.clear()
+        return self._shared_strings
+
+    @property
+    def date_styles(self):
+        """The sets of indexes of cell styles having date or timedelta
+        number formats; read when first needed.
+        """
+        if self._date_styles is None:
+            dates = set()
+            timedeltas = set()
+            if self.styles_path:
+                root = ElementTree.fromstring(
+                    self.zipfile.read(self.styles_path))
+                custom = {}
+                for numfmt in root.iter(f"{{{self.ns}}}numFmt"):
+                    custom[int(numfmt.get("numFmtId"))] = numfmt.get("formatCode")
+                cellxfs = root.find(f"{{{self.ns}}}cellXfs")
+                if cellxfs is not None:
+                    for index, xf in enumerate(cellxfs.iterfind(f"{{{self.ns}}}xf")):
+                        numfmtid = int(xf.get("numFmtId", 0))
+                        try:
+                            fmt = custom[numfmtid]
+                        except KeyError:
+                            fmt = builtin_format_code(numfmtid)
+                        if is_date_format(fmt):
+                            dates.add(index)
+                        if is_timedelta_format(fmt):
+                            timedeltas.add(index)
+            self._date_styles = (dates, timedeltas)
+        return self._date_styles
+
+    def iterparse(self, path, events=("end",)):
+        """Parse the XML file given by the path incrementally from the zip.
+        Yield (event, element) for the given events.
+        """
+        parser = ElementTree.XMLPullParser(events=events)
+        with self.zipfile.open(path) as infile:
+            while True:
+                data = infile.read(CHUNK_SIZE)
+                if not data: break
+                parser.feed(data)
+                yield from parser.read_events()
+        parser.close()
+        yield from parser.read_events()
+
+    def get_sheet_path(self, sheetname=None):
+        """Get the path of the XML for the sheet with the given name,
+        or of the active sheet. Raise KeyError if there is no such sheet.
+        """
+        if sheetname is None:
+            return list(self.sheets.values())[self.active]
+        try:
+            return self.sheets[sheetname]
+        except KeyError:
+            raise KeyError(f"Worksheet {sheetname} does not exist.")
+
+    def get_dimension(self, sheetname=None):
+        """Get the extent of the sheet declared by its 'dimension' element,
+        as a tuple (rows, columns); (None, None) if not declared.
+        Only the start of the sheet XML is parsed.
+        """
+        dimension_tag = f"{{{self.ns}}}dimension"
+        row_tag = f"{{{self.ns}}}row"
+        for event, element in self.iterparse(self.get_sheet_path(sheetname)):
+            if element.tag == dimension_tag:
+                return parse_dimension(element.get("ref", "A1"))
+            elif element.tag == row_tag:
+                break
+        return (None, None)
+
+    def iter_rows(self, sheetname=None, max_col=None):
+        """Yield the rows of the sheet with the given name, or of the active
+        sheet, as tuples of values. Rows are padded with None to the
+        width of the sheet, and empty rows between rows are produced.
+        If 'max_col' is given, no more columns than that are read.
+        The width is given by the '<dimension>' of the sheet, if any. Else,
+        as in openpyxl, the rows are padded to 'max_col', if given; if not,
+        the width is that of the widest row so far, so that rows before
+        a wider row are shorter than it.
+        Raise KeyError if there is no such sheet.
+        """
+        path = self.get_sheet_path(sheetname)
+        ns = self.ns
+        row_tag = f"{{{ns}}}row"
+        cell_tag = f"{{{ns}}}c"
+        value_tag = f"{{{ns}}}v"
+        dimension_tag = f"{{{ns}}}dimension"
+        sheetdata_tag = f"{{{ns}}}sheetData"
+        shared_strings = None
+        dates = None
+        shared_formulas = {}
+        columns = {}            # Lookup from column letters to index.
+        # Unless given by the dimension of the sheet.
+        width = max_col or 0
+        rownumber = 0
+        for event, element in self.iterparse(path):
+            tag = element.tag
+            if tag == row_tag:
+                number = element.get("r")
+                number = int(number) if number else rownumber + 1
+                # Produce empty rows for any gap.
+                while rownumber + 1 < number:
+                    rownumber += 1
+                    yield (None,) * width
+                rownumber = number
+                values = []
+                for cell in element:
+                    if cell.tag != cell_tag: continue
+                    coordinate = cell.get("r")
+                    if coordinate:
+                        letters = coordinate.rstrip(DIGITS)
+                        try:
+                            column = columns[letters]
+                        except KeyError:
+                            column = column_index_from_string(letters)
+                            columns[letters] = column
+                        if len(values) < column - 1:
+                            values.extend([None] * (column - 1 - len(values)))
+                    if max_col and len(values) >= max_col: break
+                    # Fast path for the usual cases: a number or a
+                    # shared string, without formula.
+                    if len(cell) == 1 and cell[0].tag == value_tag:
+                        value = cell[0].text
+                        data_type = cell.get("t", "n")
+                        if data_type == "s":
+                            if shared_strings is None:
+                                shared_strings = self.shared_strings
+                            values.append(shared_strings[int(value)])
+                            continue
+                        elif data_type == "n" and value:
+                            if dates is None:
+                                dates = self.date_styles[0]
+                            if int(cell.get("s", 0)) not in dates:
+                                if "." in value or "E" in value or "e" in value:
+                                    values.append(float(value))
+                                else:
+                                    values.append(int(value))
+                                continue
+                    values.append(self.get_value(cell, shared_formulas))
+                if max_col:
+                    del values[max_col:]
+                width = max(width, len(values))
+                if len(values) < width:
+                    values.extend([None] * (width - len(values)))
+                yield tuple(values)
+                # Memory use: only an empty element is kept for the row.
+                element.clear()
+            elif tag == dimension_tag:
+                width = parse_dimension(element.get("ref", "A1"))[1]
+                if max_col:
+                    width = min(width, max_col)
+            elif tag == sheetdata_tag:
+                break
+
+    def get_value(self, cell, shared_formulas):
+        "Get the value of the cell, in the same way as openpyxl."
+        ns = self.ns
+        formula = cell.find(f"{{{ns}}}f")
+        if formula is not None:
+            value = "=" + (formula.text or "")
+            if formula.get("t") == "shared":
+                index = formula.get("si")
+                if index in shared_formulas:
+                    value = shared_formulas[index].translate_formula(
+                        cell.get("r"))
+                elif value != "=":
+                    shared_formulas[index] = Translator(value, cell.get("r"))
+            return value
+        data_type = cell.get("t", "n")
+        if data_type == "inlineStr":
+            inline = cell.find(f"{{{ns}}}is")
+            if inline is None: return None
+            parts = [inline.findtext(f"{{{ns}}}t") or ""]
+            for run in inline.iterfind(f"{{{ns}}}r"):
+                parts.append(run.findtext(f"{{{ns}}}t") or "")
+            return "".join(parts)
+        value = cell.findtext(f"{{{ns}}}v") or None
+        if value is None: return None
+        if data_type == "n":
+            if "." in value or "E" in value or "e" in value:
+                value = float(value)
+            else:
+                value = int(value)
+            style = int(cell.get("s", 0))
+            dates, timedeltas = self.date_styles
+            if style in dates:
+                try:
+                    value = from_excel(value, self.epoch,
+                                       timedelta=style in timedeltas)
+                except (OverflowError, ValueError):
+                    value = "#VALUE!"
+        elif data_type == "s":
+            value = self.shared_strings[int(value)]
+        elif data_type == "b":
+            value = bool(int(value))
+        elif data_type == "d":
+            value = from_ISO8601(value)
+        return value
+
+def parse_dimension(ref):
+    """Get the number of rows and columns from the reference of the
+    'dimension' element, such as 'A1:H2000'.
+    """
+    ref = ref.split(":")[-1]
+    letters = ref.rstrip(DIGITS)
+    return (int(ref[len(letters):] or 1), column_index_from_string(letters))
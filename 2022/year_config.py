@@ -0,0 +1,179 @@
+"""The configuration of the reports for a given year.
+
+The code for reading the input files and creating the merged files is
+the same for all years since 2019; each merged file A-H is created for
+the year of the configuration given to it. What differs between years
+is given by the configuration file 'years/{year}.json', containing:
+
+- basedirpath: The directory containing the input and output files.
+- basefilename: The base of the file names of the aggregate files.
+- platform_lookup: Lookup from unit name to platform name, from
+  the file "Reporting Units {year}.xlsx".
+- unit_aliases: Lookup from a unit name used in the input files to
+  the proper name, for units that were renamed during the year.
+  The unit names in the input files are resolved by a UnitResolver,
+  which also ignores differences in character case and white-space.
+- field_identifiers: The single-valued fields for the A file, from the
+  file 'Data files for KTH and Infra Reports.xlsx'.
+- column_headers: The column headers of the A file; must match the
+  order of the field identifiers, except for the two first.
+- long_text_columns: The first and last column in the A file
+  having long texts.
+- person_fields: The fields for a person in the B file.
+- sheetnames: The names of the sheets in the volume data files.
+- filenames: The file names of the merged files A-H.
+
+Any item not in the file is given the default value below.
+The file names may contain '{year}', which is replaced by the year.
+"""
+
+import json
+import os.path
+import unicodedata
+
+### Path to the directory containing the configuration files.
+YEARSDIRPATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "years")
+
+DEFAULTS = {
+    "unit_aliases": {},
+    "person_fields": ["First name",
+                      "Last name",
+                      "Email address",
+                      "Affiliation (University)",
+                      "Percent salary"],
+    # NOTE: 'D. External Collab ' has a trailing blank!
+    # Madness! The sheet name for the collaborations has a trailing blank!
+    "sheetnames": {"users": "A. Users",
+                   "courses": "B. Courses",
+                   "conferences": "C. Conf, symp, semin",
+                   "collaborations": "D. External Collab "},
+    "filenames": {"A": "A_Infrastructure Single Data Reported {year}.xlsx",
+                  "B": "B_Infrastructure FD and HF {year}.xlsx",
+                  "C": "C_Infrastructure Other Funding {year}.xlsx",
+                  "D": "D_Infrastructure Immaterial Property Rights {year}.xlsx",
+                  "E": "E_Infrastructure Users {year}.xlsx",
+                  "F": "F_Infrastructure Courses {year}.xlsx",
+                  "G": "G_Infrastructure Conferences Symposia Seminars {year}.xlsx",
+                  "H": "H_Infrastructure External Collaborations {year}.xlsx"},
+}
+
+
+class YearConfig:
+    "The configuration of the reports for a year."
+
+    def __init__(self, data):
+        self.year = data["year"]
+        self.basedirpath = os.path.expanduser(data["basedirpath"])
+        self.basefilename = data["basefilename"]
+        # Path to directory containing the downloaded aggregate files.
+        self.dirpath = os.path.join(self.basedirpath, "aggregate_files")
+        # Path to directory containing the downloaded volume data files.
+        self.voldirpath = os.path.join(self.basedirpath, "volume_data_files")
+        # Path to directory containing the merged files.
+        self.mergeddirpath = os.path.join(self.basedirpath, "merged_files")
+        self.platform_lookup = data["platform_lookup"]
+        self.unit_aliases = data["unit_aliases"]
+        self.units = UnitResolver(self.platform_lookup, self.unit_aliases)
+        self.field_identifiers = data["field_identifiers"]
+        self.column_headers = data["column_headers"]
+        self.long_text_columns = data["long_text_columns"]
+        self.person_fields = data["person_fields"]
+        self.sheetnames = data["sheetnames"]
+        self.filenames = dict([(k, v.format(year=self.year))
+                               for k, v in data["filenames"].items()])
+
+    def __repr__(self):
+        return f"YearConfig({self.year})"
+
+    def get_aggregate_filepath(self, table=None):
+        """Get the path of the aggregate file for the table field,
+        or of the aggregate file for the single-valued fields.
+        """
+        if table:
+            return os.path.join(self.dirpath, f"{self.basefilename}_{table}.xlsx")
+        else:
+            return os.path.join(self.dirpath, f"{self.basefilename}.xlsx")
+
+    def get_merged_filepath(self, target):
+        "Get the path of the merged file for the target letter."
+        return os.path.join(self.mergeddirpath, self.filenames[target])
+
+    def lookup_unit(self, name):
+        """Get the proper unit name and its platform for the name
+        given in an input file. Raise KeyError if no such unit.
+        """
+        return self.units.resolve(name)
+
+
+class UnitResolver:
+    """Resolve the unit names given in the input files to the proper
+    unit name and its platform, for the units of a year.
+    Bizarrely, the names in the input files sometimes have wrong character
+    case, or extra white-space, so the names are compared normalized.
+    A unit renamed during the year is also found by its alias.
+    The result for each name seen is remembered.
+    """
+
+    def __init__(self, platform_lookup, unit_aliases={}):
+        """Index the normalized names of the units and their aliases.
+        Raise ValueError if an alias is for an unknown unit.
+        """
+        self.platform_lookup = platform_lookup
+        self.index = {}
+        for name, platform in platform_lookup.items():
+            self.index[self.normalize(name)] = (name, platform)
+        for alias, name in unit_aliases.items():
+            try:
+                self.index[self.normalize(alias)] = (name,
+                                                     platform_lookup[name])
+            except KeyError:
+                raise ValueError(f"alias '{alias}' for unknown unit '{name}'")
+        # The result for each name seen; the proper names are exact.
+        self.memo = dict([(name, (name, platform))
+                          for name, platform in platform_lookup.items()])
+
+    def __repr__(self):
+        return f"UnitResolver({len(self.platform_lookup)} units)"
+
+    def normalize(self, name):
+        """Normalize the Unicode characters, the character case and
+        the white-space of the name.
+        """
+        name = unicodedata.normalize("NFKC", name).casefold()
+        return " ".join(name.split())
+
+    def resolve(self, name):
+        """Get the tuple (proper unit name, platform) for the name given
+        in an input file. Raise KeyError if no such unit.
+        """
+        try:
+            return self.memo[name]
+        except KeyError:
+            pass
+        if not isinstance(name, str):
+            raise KeyError(name)
+        result = self.index[self.normalize(name)]
+        self.memo[name] = result
+        return result
+
+
+def load(year):
+    """Load the configuration for the year from its file.
+    Raise ValueError if there is no configuration for the year.
+    """
+    filepath = os.path.join(YEARSDIRPATH, f"{year}.json")
+    try:
+        with open(filepath) as infile:
+            data = json.load(infile)
+    except FileNotFoundError:
+        raise ValueError(f"no configuration for year {year}")
+    for key, value in DEFAULTS.items():
+        data.setdefault(key, value)
+    return YearConfig(data)
+
+def get_years():
+    "Get the years having a configuration file, in order."
+    return sorted([int(os.path.splitext(filename)[0])
+                   for filename in os.listdir(YEARSDIRPATH)
+                   if filename.endswith(".json")])
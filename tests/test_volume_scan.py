@@ -0,0 +1,248 @@
+"""Test the reading of the users sheet of a Volume data file.
+
+A synthetic file with several thousand users is created, having a few
+lines of instructions before the header row, PI email addresses given
+as formulas, and a row after the data which must not be read.
+The scan of a sheet must visit each row at most once.
+Both engines must give the same records also for a file whose sheets
+do not declare their extent (no '<dimension>' element).
+
+    $ python -m pytest tests/test_volume_scan.py
+"""
+
+import contextlib
+import io
+import os.path
+import re
+import sys
+import tempfile
+import unittest
+import zipfile
+
+import xlsxwriter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "2022"))
+
+import facility_data
+
+SHEETNAME = "A. Users"
+
+# The header "1. Name of reporting unit..." has two white-space after "1."
+# in the files, and only one in the records.
+HEADER = ["1.  Name of reporting unit* (choose from drop-down menu)",
+          "2. Your e-mail address*",
+          "3a. First name of the responsible PI*",
+          "3b. Surname of the responsible PI*",
+          "4. E-mail address of responsible PI*"]
+
+USERS = 3000
+
+# The row having data after the empty row, which is not read.
+STRAY_ROW = USERS + 7
+
+
+def make_file(filepath):
+    """Create the synthetic Volume data file. Every tenth PI email address
+    is a formula computing it from the PI name. Return the expected records.
+    """
+    wb = xlsxwriter.Workbook(filepath)
+    ws = wb.add_worksheet(SHEETNAME)
+    ws.write(0, 0, "Instructions")
+    ws.write(1, 1, "Fill in one row per user.")
+    ws.write_row(3, 0, HEADER)
+    key = " ".join(HEADER[0].split())
+    result = []
+    for row in range(4, 4 + USERS):
+        first, last = f"Anna{row}", f"Berg{row}"
+        ws.write_row(row, 0, ["AIDA Data Hub", f"staff{row}@example.se",
+                              first, last])
+        if row % 10 == 0:
+            ws.write_formula(row, 4, f'=C{row+1}&"."&D{row+1}&"@example.se"')
+        else:
+            ws.write(row, 4, f"{first}.{last}@example.se")
+        result.append({key: "AIDA Data Hub",
+                       HEADER[1]: f"staff{row}@example.se",
+                       HEADER[2]: first,
+                       HEADER[3]: last,
+                       HEADER[4]: f"{first}.{last}@example.se"})
+    # After the first row having no unit name, nothing is read.
+    # This is the row number STRAY_ROW in the sheet.
+    ws.write(6 + USERS, 0, "Not a user")
+    wb.close()
+    return result
+
+def strip_dimension(filepath):
+    "Remove the '<dimension>' element from the sheets of the XLSX file."
+    with zipfile.ZipFile(filepath) as infile:
+        items = [(info, infile.read(info)) for info in infile.infolist()]
+    with zipfile.ZipFile(filepath, "w") as outfile:
+        for info, data in items:
+            if info.filename.startswith("xl/worksheets/"):
+                data = re.sub(rb"<dimension[^>]*/>", b"", data)
+            outfile.writestr(info, data)
+
+def make_ragged_file(filepath):
+    """Create a Volume data file without '<dimension>', where the rows
+    have different lengths: short rows, and rows wider than the header.
+    """
+    wb = xlsxwriter.Workbook(filepath)
+    ws = wb.add_worksheet(SHEETNAME)
+    ws.write(0, 0, "Instructions")
+    ws.write_row(3, 0, HEADER)
+    ws.write_row(4, 0, ["AIDA Data Hub", "staff@example.se"])
+    ws.write_row(5, 0, ["AIDA Data Hub", "staff@example.se", "Anna", "Berg",
+                        "anna.berg@example.se", "a note", "another note"])
+    ws.write_row(6, 0, ["AIDA Data Hub"])
+    wb.close()
+    strip_dimension(filepath)
+
+def make_ragged_aggregate_file(filepath):
+    """Create an aggregate file without '<dimension>', where the rows
+    have different lengths.
+    """
+    wb = xlsxwriter.Workbook(filepath)
+    ws = wb.add_worksheet()
+    ws.write_row(0, 0, ["identifier", "facility", "value"])
+    ws.write_row(1, 0, ["id1"])
+    ws.write_row(2, 0, ["id2", "AIDA Data Hub", 1, "a note"])
+    ws.write_row(3, 0, ["id3", "AIDA Data Hub"])
+    wb.close()
+    strip_dimension(filepath)
+
+def make_rows(users, empty):
+    """Get the rows of a sheet having the given number of users, and
+    the given number of empty rows after them.
+    """
+    result = [("Instructions",), (None, "Fill in one row per user."), ()]
+    result.append(tuple(HEADER))
+    for row in range(users):
+        result.append(("AIDA Data Hub", f"staff{row}@example.se",
+                       "Anna", "Berg", "anna.berg@example.se"))
+    result.extend([(None,) * len(HEADER)] * empty)
+    return result
+
+
+class CountingSheet:
+    "A sheet counting the number of scans of its rows, and the rows visited."
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.scans = 0
+        self.visited = 0
+
+    def iter_rows(self, **kwargs):
+        self.scans += 1
+        for row in self.rows:
+            self.visited += 1
+            yield row
+
+
+class TestVolumeScan(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.filepath = os.path.join(cls.tmpdir.name, "volume.xlsx")
+        cls.expected = make_file(cls.filepath)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def test_openpyxl(self):
+        "All users are read, up to the first row without a unit name."
+        records = facility_data.read_volume_file(self.filepath, SHEETNAME,
+                                                 "Name of reporting unit",
+                                                 engine="openpyxl")
+        self.assertEqual(records, self.expected)
+
+    def test_xlsx(self):
+        "The xlsx_reader engine gives the same records."
+        records = facility_data.read_volume_file(self.filepath, SHEETNAME,
+                                                 "Name of reporting unit",
+                                                 engine="xlsx")
+        self.assertEqual(records, self.expected)
+
+    def test_stray_row(self):
+        "The data after the first row without a unit name is logged."
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            facility_data.read_volume_file(self.filepath, SHEETNAME,
+                                           "Name of reporting unit")
+        self.assertIn(f"'{SHEETNAME}': data in row {STRAY_ROW}",
+                      output.getvalue())
+
+    def test_scaling(self):
+        """The rows are scanned once, up to PHANTOM_ROWS rows after the data,
+        whatever the number of users and of empty rows after them.
+        """
+        visited = {}
+        for users in (1000, 4000):
+            empty = 2 * users + facility_data.PHANTOM_ROWS
+            sheet = CountingSheet(make_rows(users, empty))
+            records = facility_data.read_volume_sheet(sheet,
+                                                      "Name of reporting unit")
+            self.assertEqual(len(records), users)
+            self.assertEqual(sheet.scans, 1)
+            visited[users] = sheet.visited
+        # The instructions and the header, the users, the first empty row,
+        # and the rows looked at after it.
+        self.assertEqual(visited[1000],
+                         4 + 1000 + 1 + facility_data.PHANTOM_ROWS)
+        self.assertEqual(visited[4000] - visited[1000], 3000)
+
+    def test_no_header(self):
+        "A sheet without the header row is an error."
+        with self.assertRaises(KeyError):
+            facility_data.scan_volume_rows([("a",), ("b",)],
+                                           "Name of reporting unit")
+
+
+class TestNoDimension(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.filepath = os.path.join(cls.tmpdir.name, "ragged.xlsx")
+        make_ragged_file(cls.filepath)
+        cls.aggregate_filepath = os.path.join(cls.tmpdir.name,
+                                              "aggregate.xlsx")
+        make_ragged_aggregate_file(cls.aggregate_filepath)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def test_volume_records(self):
+        "Both engines give the same records, each having all the keys."
+        result = {}
+        for engine in ("openpyxl", "xlsx"):
+            result[engine] = facility_data.read_volume_file(
+                self.filepath, SHEETNAME, "Name of reporting unit",
+                engine=engine)
+        self.assertEqual(result["openpyxl"], result["xlsx"])
+        self.assertEqual(len(result["xlsx"]), 3)
+        key = " ".join(HEADER[0].split())
+        for record in result["xlsx"]:
+            self.assertEqual(set(record), set([key] + HEADER[1:]))
+        self.assertIsNone(result["xlsx"][2][HEADER[1]])
+
+    def test_file_records(self):
+        "Both engines give the same records from an aggregate file."
+        result = {}
+        for engine in ("openpyxl", "xlsx"):
+            result[engine] = list(facility_data.iter_file(
+                self.aggregate_filepath, engine=engine))
+        self.assertEqual(result["openpyxl"], result["xlsx"])
+        self.assertEqual(result["xlsx"],
+                         [{"identifier": "id1", "facility": None,
+                           "value": None},
+                          {"identifier": "id2", "facility": "AIDA Data Hub",
+                           "value": 1},
+                          {"identifier": "id3", "facility": "AIDA Data Hub",
+                           "value": None}])
+
+
+if __name__ == "__main__":
+    unittest.main()